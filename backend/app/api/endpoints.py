@@ -1,8 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 
 from .routers import health, users, scan, chat
 
-api_router = APIRouter()
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 api_router.include_router(health.router, prefix="/health", tags=["Health"])
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
@@ -1,20 +1,34 @@
 # app/api_v1/chat.py
-from typing import Dict, List
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
 from uuid import UUID
 
 from fastapi import (
     APIRouter,
     Depends,
+    Query,
+    Response,
     WebSocket,
     WebSocketDisconnect,
     HTTPException,
 )
 
-from dependencies.deps import CurrentUser
-from dependencies.auth import role_required
-from services.chat_service import get_chat_service, ChatService
-from services.message_service import get_message_service, MessageService
-from schemas.chat import ChatCreate, MessageOut
+from core.config import settings
+from database import AsyncSessionLocal
+from dependencies.deps import CurrentUser, get_current_user_ws
+from dependencies.auth import issue_ws_ticket, role_required
+from sockets import manager
+from services.chat_service import build_chat_service, get_chat_service, ChatService
+from services.message_service import build_message_service, get_message_service, MessageService
+from schemas.chat import (
+    ChatCreate,
+    ChatOut,
+    InboxEntry,
+    MessageHistoryPage,
+    MessageSearchHit,
+    WSTicketOut,
+)
+from schemas.pagination import Page
 
 router = APIRouter()
 
@@ -30,8 +44,75 @@ async def create_chat(
     current_user: CurrentUser,
     svc: ChatService = Depends(get_chat_service),
 ):
-    # optionally enforce that current_user.id == payload.customer_id
-    return await svc.create_chat(payload.customer_id, payload.merchant_id)
+    # the customer side is always the caller
+    return await svc.create_chat(UUID(current_user["id"]), payload.merchant_id)
+
+
+@router.get(
+    "/list",
+    summary="List the current user's conversations, newest first",
+    response_model=Page[ChatOut],
+)
+async def list_chats(
+    current_user: CurrentUser,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    svc: ChatService = Depends(get_chat_service),
+):
+    chats, next_cursor = await svc.get_chats_page_for_user(
+        UUID(current_user["id"]), limit=limit, cursor=cursor
+    )
+    return Page[ChatOut](items=chats, next_cursor=next_cursor)
+
+
+@router.get(
+    "/inbox",
+    summary="Conversations with last message and unread count, most recent first",
+    response_model=Page[InboxEntry],
+)
+async def inbox(
+    current_user: CurrentUser,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    svc: ChatService = Depends(get_chat_service),
+):
+    items, next_cursor = await svc.get_inbox(
+        UUID(current_user["id"]), limit=limit, cursor=cursor
+    )
+    return Page[InboxEntry](items=items, next_cursor=next_cursor)
+
+
+@router.get(
+    "/search",
+    summary="Full-text search over messages in the caller's conversations",
+    response_model=Page[MessageSearchHit],
+)
+async def search_messages(
+    current_user: CurrentUser,
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: Optional[UUID] = Query(None, description="Only search this conversation"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    msg_svc: MessageService = Depends(get_message_service),
+):
+    hits, next_cursor = await msg_svc.search_messages(
+        UUID(current_user["id"]), q, chat_id=chat_id, limit=limit, cursor=cursor
+    )
+    return Page[MessageSearchHit](items=hits, next_cursor=next_cursor)
+
+
+@router.post(
+    "/{chat_id}/read",
+    summary="Mark a conversation as read up to its last message",
+    status_code=204,
+)
+async def mark_read(
+    chat_id: UUID,
+    current_user: CurrentUser,
+    svc: ChatService = Depends(get_chat_service),
+):
+    await svc.mark_read(chat_id, UUID(current_user["id"]))
+    return Response(status_code=204)
 
 
 @router.get(
@@ -46,70 +127,147 @@ async def read_chat(
 
 @router.get(
     "/get/{chat_id}/messages",
-    summary="List all messages in a conversation",
+    summary="Page through a conversation's messages, newest first",
+    response_model=MessageHistoryPage,
     dependencies=[Depends(role_required("customer", "merchant"))]
 )
 async def read_messages(
-    chat_id: UUID, msg_svc: MessageService = Depends(get_message_service)
+    chat_id: UUID,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = Query(None, description="before_cursor of a previous page"),
+    after: Optional[str] = Query(None, description="after_cursor of a previous page"),
+    msg_svc: MessageService = Depends(get_message_service),
 ):
-    return [MessageOut.model_validate(m).model_dump() for m in await msg_svc.get_messages_for_chat(chat_id)]
-
-
+    return await msg_svc.get_messages_page(chat_id, limit=limit, before=before, after=after)
 
-# ---- WebSocket for live two‐way chat ----
-
-class ConnectionManager:
-    def __init__(self):
-        self.active: Dict[str, List[WebSocket]] = {}
 
-    async def connect(self, room: str, ws: WebSocket):
-        await ws.accept()
-        self.active.setdefault(room, []).append(ws)
 
-    def disconnect(self, room: str, ws: WebSocket):
-        self.active[room].remove(ws)
-        if not self.active[room]:
-            del self.active[room]
+@router.post(
+    "/ws-ticket/{chat_id}",
+    summary="Issue a short-lived ticket for connecting to a chat's WebSocket",
+    response_model=WSTicketOut,
+)
+async def create_ws_ticket(
+    chat_id: UUID,
+    current_user: CurrentUser,
+    svc: ChatService = Depends(get_chat_service),
+):
+    if not await svc.is_member(chat_id, UUID(current_user["id"])):
+        raise HTTPException(status_code=403, detail="Not a participant of this chat")
+    ticket, expires_in = issue_ws_ticket(current_user, str(chat_id))
+    return WSTicketOut(ticket=ticket, expires_in=expires_in)
 
-    async def broadcast(self, room: str, msg: dict):
-        for conn in self.active.get(room, []):
-            await conn.send_json(msg)
 
+# ---- WebSocket for live two‐way chat ----
 
-manager = ConnectionManager()
+@asynccontextmanager
+async def socket_services() -> AsyncIterator[Tuple[ChatService, MessageService]]:
+    """
+    Services on a session of their own, for one operation of a socket. A
+    socket lives for hours; between frames it must not hold a pooled
+    connection or an open transaction.
+    """
+    async with AsyncSessionLocal() as db:
+        yield build_chat_service(db), build_message_service(db)
 
 
 @router.websocket("/ws/{chat_id}")
 async def websocket_chat(
     chat_id: UUID,
     websocket: WebSocket,
-    current_user: CurrentUser,
-    chat_svc: ChatService = Depends(get_chat_service),
-    msg_svc: MessageService = Depends(get_message_service),
+    current_user: dict = Depends(get_current_user_ws),
 ):
-    # 1) verify chat exists & that user is allowed
-    chat = await chat_svc.get_chat_by_id(chat_id)
-    if current_user.id not in {chat.customer_id, chat.merchant_id}:
-        await websocket.close(code=1008)
-        return
+    if current_user is None:
+        return  # handshake already rejected
+    user_id = UUID(current_user["id"])
+
+    # 1) verify chat exists & that user is allowed (a ticket for this chat already proves it)
+    if current_user.get("chat_id") != str(chat_id):
+        try:
+            async with socket_services() as (chat_svc, _):
+                allowed = await chat_svc.is_member(chat_id, user_id)
+        except HTTPException:
+            allowed = False
+        if not allowed:
+            await websocket.close(code=1008)
+            return
 
     room = str(chat_id)
-    await manager.connect(room, websocket)
+    conn = await manager.connect(room, websocket, user_id=current_user["id"], presence=True)
+    if conn is None:
+        return  # over the room's socket cap
+
+    # 2) resuming client: ?last_seen_id=<message id> or ?cursor=<history cursor>
+    last_seen_id = websocket.query_params.get("last_seen_id")
+    resume_cursor = websocket.query_params.get("cursor")
+    if last_seen_id or resume_cursor:
+        try:
+            async with socket_services() as (_, msg_svc):
+                missed = await msg_svc.get_messages_since(
+                    chat_id,
+                    last_seen_id=UUID(last_seen_id) if last_seen_id else None,
+                    cursor=resume_cursor,
+                    limit=settings.WS_REPLAY_LIMIT,
+                )
+            # live frames may already be queued; clients de-duplicate by id
+            manager.send_personal(conn, {"type": "replay", **missed.model_dump(mode="json")})
+        except (HTTPException, ValueError) as e:
+            detail = e.detail if isinstance(e, HTTPException) else "Invalid last_seen_id"
+            manager.send_personal(conn, {"type": "error", "detail": detail})
 
     try:
         while True:
             data = await websocket.receive_json()
+            conn.touch()
+            kind = data.get("type", "message")
+            if kind == "pong":
+                continue  # heartbeat reply
+            if kind == "ping":
+                manager.send_personal(conn, {"type": "pong"})
+                continue
+            if kind == "typing":
+                # ephemeral: relayed to the room, rate limited, never stored
+                await manager.emit(conn, "typing", state=bool(data.get("state", True)))
+                continue
+            if kind == "history":
+                # lazy-load on scroll: {"type": "history", "before": cursor, "limit": 50}
+                try:
+                    limit = int(data.get("limit", 50))
+                except (TypeError, ValueError):
+                    manager.send_personal(conn, {"type": "error", "detail": "limit must be an integer"})
+                    continue
+                try:
+                    async with socket_services() as (_, msg_svc):
+                        page = await msg_svc.get_messages_page(
+                            chat_id,
+                            limit=max(1, min(limit, 200)),
+                            before=data.get("before"),
+                            after=data.get("after"),
+                        )
+                except HTTPException as e:
+                    manager.send_personal(conn, {"type": "error", "detail": e.detail})
+                    continue
+                manager.send_personal(conn, {"type": "history", **page.model_dump(mode="json")})
+                continue
+            if kind != "message":
+                manager.send_personal(conn, {"type": "error", "detail": f"Unknown frame type {kind}"})
+                continue
             # expect: {"content": "...", "image_url": None}
             payload = {
                 "conversation_id": chat_id,
-                "sender_id": current_user.id,
-                **data,
+                "sender_id": user_id,
+                "content": data.get("content"),
+                "image_url": data.get("image_url"),
             }
-            msg = await msg_svc.send_message(payload)
-            # Pydantic v2: validate from ORM and dump to dict
-            out = MessageOut.model_validate(msg).model_dump()
-            await manager.broadcast(room, out)
+            # persisted, then published to the room on every worker
+            try:
+                async with socket_services() as (_, msg_svc):
+                    await msg_svc.send_message(payload)
+            except HTTPException as e:
+                manager.send_personal(conn, {"type": "error", "detail": e.detail})
     except WebSocketDisconnect:
-        manager.disconnect(room, websocket)
+        pass
     except Exception:
         await websocket.close(code=1011)
+    finally:
+        manager.disconnect(room, websocket)
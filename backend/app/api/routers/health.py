@@ -2,9 +2,46 @@ from http import HTTPStatus
 
 from fastapi import APIRouter
 
+from crud.cache import cache_statistics
+from crud.write_behind import write_behind_statistics
+from db_pool import pool_statistics
+from sockets import manager
+from services.scan_service import prediction_statistics
+from services.worker_pool import worker_pool_statistics
+
 router = APIRouter()
 
 
 @router.get("/check")
 async def health():
     return {"status": HTTPStatus.OK.value}
+
+
+@router.get("/pool", summary="Live database connection pool statistics")
+async def pool_health():
+    return {"status": HTTPStatus.OK.value, "pools": pool_statistics()}
+
+
+@router.get("/cache", summary="In-process cache sizes and hit rates")
+async def cache_health():
+    return {"status": HTTPStatus.OK.value, "caches": cache_statistics()}
+
+
+@router.get("/write-behind", summary="Pending and flushed rows of write-behind buffers")
+async def write_behind_health():
+    return {"status": HTTPStatus.OK.value, "buffers": write_behind_statistics()}
+
+
+@router.get("/realtime", summary="Open chat sockets, queued bytes and limits on this worker")
+async def realtime_health():
+    return {"status": HTTPStatus.OK.value, "sockets": manager.stats()}
+
+
+@router.get("/predictions", summary="Scan prediction cache hit rate by tier")
+async def prediction_health():
+    return {"status": HTTPStatus.OK.value, "predictions": prediction_statistics()}
+
+
+@router.get("/workers", summary="Queued, running and finished jobs of background worker pools")
+async def workers_health():
+    return {"status": HTTPStatus.OK.value, "pools": worker_pool_statistics()}
@@ -1,14 +1,27 @@
 # app/api_v1/scan.py
-from uuid import uuid4
-import os
+from typing import Optional
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Query,
+    Response,
+    UploadFile,
+    HTTPException,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from sqlalchemy.exc import SQLAlchemyError
 
-from dependencies.deps import CurrentUser, DBSessionDep
+from core.config import settings
+from dependencies.deps import CurrentUser, DBSessionDep, get_current_user_ws
 from dependencies.auth import role_required
-from schemas.scan import ScanResultOut
-from services.scan_service import get_scan_service, ScanResultService
+from sockets import manager
+from schemas.pagination import Page
+from schemas.scan import ScanJobOut, ScanResultOut
+from services.scan_service import get_scan_service, scan_room, ScanResultService
 
 router = APIRouter()
 
@@ -19,40 +32,99 @@ router = APIRouter()
 )
 async def upload_and_scan(
     current_user: CurrentUser,
+    response: Response,
     file: UploadFile = File(...),
     scan_service: ScanResultService = Depends(get_scan_service),
 ):
-    # 1) save upload locally (or to your storage of choice)
-    upload_dir = "uploads/scans"
-    os.makedirs(upload_dir, exist_ok=True)
-    filename = f"{uuid4().hex}_{file.filename}"
-    file_path = os.path.join(upload_dir, filename)
+    user_id = UUID(current_user["id"])
+    # unknown user or full job queue: refuse before storing anything
+    await scan_service.check_can_scan(user_id)
 
+    # 1) stream the upload to storage (size-capped, sniffed, hashed on the way)
+    stored = await scan_service.store_upload(file)
     try:
-        contents = await file.read()
-        with open(file_path, "wb") as out_file:
-            out_file.write(contents)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Could not save uploaded file")
-
-    # 2) run your prediction logic (stubbed here)
-    #    Replace `perform_scan_prediction` with your actual inference call
-    try:
-        pass
-        # prediction = await perform_scan_prediction(file_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Scan prediction failed")
+        if settings.SCAN_JOB_MODE:
+            # answer now; the worker pool predicts and pushes the result
+            job = await scan_service.enqueue_scan(user_id, stored)
+            response.status_code = 202
+            return ScanJobOut.model_validate(job)
+
+        # 2) predict, unless this image was already scanned by the current model
+        try:
+            prediction = await scan_service.predict(stored.sha256, stored.path)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Scan prediction failed")
+
+        # 3) record in DB
+        try:
+            scan = await scan_service.create_scan_result(
+                {
+                    "user_id": user_id,
+                    "prediction": prediction,
+                },
+                upload=stored,
+            )
+        except SQLAlchemyError:
+            raise HTTPException(status_code=500, detail="Failed to persist scan result")
+
+        if not scan:
+            raise HTTPException(status_code=500, detail="Unknown error")
+        return scan
+    finally:
+        # a scan or job moved the file into the blob store; anything still
+        # staged belongs to a request that failed
+        await scan_service.discard_upload(stored)
 
-    # 3) record in DB
+
+@router.get(
+    "/list",
+    summary="List the current user's scan results, newest first",
+    response_model=Page[ScanResultOut],
+)
+async def list_scans(
+    current_user: CurrentUser,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    scan_service: ScanResultService = Depends(get_scan_service),
+):
+    scans, next_cursor = await scan_service.get_scans_page_for_user(
+        UUID(current_user["id"]), limit=limit, cursor=cursor
+    )
+    return Page[ScanResultOut](items=scans, next_cursor=next_cursor)
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="Status of a queued scan, with its result once done",
+    response_model=ScanJobOut,
+)
+async def get_scan_job(
+    job_id: UUID,
+    current_user: CurrentUser,
+    scan_service: ScanResultService = Depends(get_scan_service),
+):
+    return await scan_service.get_job(job_id, UUID(current_user["id"]))
+
+
+@router.websocket("/ws")
+async def websocket_scan_jobs(
+    websocket: WebSocket,
+    current_user: dict = Depends(get_current_user_ws),
+):
+    """Pushes a {"type": "scan_job", ...} frame when one of the user's jobs finishes."""
+    if current_user is None:
+        return  # handshake already rejected
+    room = scan_room(current_user["id"])
+    conn = await manager.connect(room, websocket)
+    if conn is None:
+        return
     try:
-        scan = await scan_service.create_scan_result({
-            "user_id": current_user.id,
-            "image_url": file_path,
-            # "prediction": prediction,
-        })
-    except SQLAlchemyError:
-        raise HTTPException(status_code=500, detail="Failed to persist scan result")
-
-    if not scan:
-        raise HTTPException(status_code=500, detail="Unknown error")
-    return scan
+        while True:
+            data = await websocket.receive_json()
+            conn.touch()
+            if data.get("type") == "ping":
+                manager.send_personal(conn, {"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(room, websocket)
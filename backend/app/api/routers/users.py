@@ -1,11 +1,13 @@
 # app/api_v1/users.py
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 
+from dependencies.auth import role_required
 from dependencies.deps import CurrentUser, DBSessionDep
-from schemas.users import UserBase, UserUpdate
+from schemas.bulk import BulkResult
+from schemas.users import UserBase, UserBulkUpdate, UserUpdate
 from services.users_service import get_user_service, UserService
 from models.users import UserRole
 
@@ -29,11 +31,18 @@ async def read_current_user(
 
 @router.get("/getAll")
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: Optional[int] = Query(None, ge=0, description="Legacy offset pagination"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Value of a previous X-Next-Cursor header"),
     svc: UserService = Depends(get_user_service),
 ):
-    return await svc.get_all_users(skip=skip, limit=limit)
+    if skip is not None:
+        return await svc.get_all_users(skip=skip, limit=limit)
+    users, next_cursor = await svc.get_users_page(limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
 
 
 @router.get("/get/{user_id}")
@@ -62,3 +71,47 @@ async def delete_user(
     svc: UserService = Depends(get_user_service),
 ):
     await svc.delete_user(user_id, current_user)
+
+
+# ---- Bulk endpoints (superadmin only) ----
+
+@router.post(
+    "/bulk/create",
+    status_code=status.HTTP_201_CREATED,
+    response_model=BulkResult,
+    dependencies=[Depends(role_required("superadmin"))],
+)
+async def bulk_create_users(
+    payload: List[UserBase],
+    response: Response,
+    svc: UserService = Depends(get_user_service),
+):
+    result = await svc.bulk_create_users(payload)
+    if result.succeeded < result.requested:
+        # a chunk failed: the rows after it were not inserted
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return result
+
+
+@router.put(
+    "/bulk/update",
+    response_model=BulkResult,
+    dependencies=[Depends(role_required("superadmin"))],
+)
+async def bulk_update_users(
+    payload: List[UserBulkUpdate],
+    svc: UserService = Depends(get_user_service),
+):
+    return await svc.bulk_update_users(payload)
+
+
+@router.post(
+    "/bulk/delete",
+    response_model=BulkResult,
+    dependencies=[Depends(role_required("superadmin"))],
+)
+async def bulk_delete_users(
+    payload: List[UUID],
+    svc: UserService = Depends(get_user_service),
+):
+    return await svc.bulk_delete_users(payload)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field, SecretStr, field_validator
@@ -16,6 +16,9 @@ class Settings(BaseSettings):
 
     # Supabase settings
     DATABASE_URI: str = Field(..., description="Database URI for SQLAlchemy")
+    DATABASE_REPLICA_URI: Optional[str] = Field(
+        None, description="Read replica URI; plain SELECTs are routed here when set"
+    )
     SUPABASE_URL: str = Field(..., description="Supabase Instant URL")
     SUPABASE_SECRET_KEY: str = Field(..., description="Secret key for Supabase")
     SUPABASE_ANON_KEY: str = Field(
@@ -23,6 +26,198 @@ class Settings(BaseSettings):
     )
     ECHO_SQL: bool = Field(False, description="Whether to echo SQL queries")
 
+    # Connection pool settings (ignored for SQLite)
+    DB_POOL_SIZE: int = Field(5, description="Persistent connections kept per worker")
+    DB_MAX_OVERFLOW: int = Field(
+        10, description="Extra connections allowed above DB_POOL_SIZE under load"
+    )
+    DB_POOL_TIMEOUT: float = Field(
+        30.0, description="Seconds to wait for a free connection before failing"
+    )
+    DB_POOL_RECYCLE: int = Field(
+        1800, description="Recycle connections older than this many seconds (-1 disables)"
+    )
+    DB_POOL_PRE_PING: bool = Field(
+        True, description="Test connections for liveness on checkout"
+    )
+    DB_STATEMENT_TIMEOUT_MS: Optional[int] = Field(
+        None, description="Server-side per-statement timeout in milliseconds"
+    )
+    DB_UNIT_OF_WORK: bool = Field(
+        True,
+        description="Defer BaseCRUD commits to a single commit at the end of each request",
+    )
+    DB_BULK_CHUNK_SIZE: int = Field(
+        500, description="Rows per statement/transaction for BaseCRUD bulk operations"
+    )
+
+    # Entity cache settings (BaseCRUD.get_by_id read-through cache)
+    ENTITY_CACHE_ENABLED: bool = Field(True, description="Cache point lookups by id")
+    ENTITY_CACHE_TTL_SECONDS: float = Field(
+        30.0, description="Seconds a cached row may be served before reloading"
+    )
+    ENTITY_CACHE_MAXSIZE: int = Field(
+        10000, description="Maximum cached rows per worker (LRU eviction)"
+    )
+
+    # Auth settings
+    JWT_VERIFY_LOCALLY: bool = Field(
+        True, description="Verify access tokens offline instead of calling Supabase"
+    )
+    JWT_REMOTE_FALLBACK: bool = Field(
+        True,
+        description="Fall back to supabase.auth.get_user when no local key is available",
+    )
+    SUPABASE_JWT_SECRET: Optional[str] = Field(
+        None, description="Supabase JWT secret used to verify HS256 tokens"
+    )
+    SUPABASE_JWKS_URL: Optional[str] = Field(
+        None,
+        description="JWKS endpoint for asymmetric tokens (defaults to the Supabase auth JWKS)",
+    )
+    JWT_AUDIENCE: str = Field("authenticated", description="Expected token audience")
+    JWT_LEEWAY_SECONDS: int = Field(
+        10, description="Clock skew tolerated when checking exp/nbf"
+    )
+    JWKS_CACHE_SECONDS: int = Field(
+        3600, description="How long fetched signing keys are cached"
+    )
+    JWKS_MIN_REFRESH_SECONDS: int = Field(
+        60,
+        description="Minimum seconds between JWKS fetches, however many unknown key ids arrive",
+    )
+
+    # Chat WebSocket settings
+    WS_SEND_QUEUE_SIZE: int = Field(
+        256, description="Outbound frames buffered per socket before it counts as slow"
+    )
+    WS_SLOW_CONSUMER_POLICY: Literal["drop", "disconnect"] = Field(
+        "disconnect",
+        description="What to do when a socket's queue is full: 'drop' the frame or 'disconnect' it",
+    )
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = Field(
+        25, description="How often sockets are pinged and idle ones reaped (0 disables)"
+    )
+    WS_PRESENCE_TTL_SECONDS: float = Field(
+        90,
+        description="Forget users present on another worker once it has been silent this long "
+        "(workers heartbeat every WS_HEARTBEAT_INTERVAL_SECONDS; 0 disables)",
+    )
+    WS_IDLE_TIMEOUT_SECONDS: float = Field(
+        0,
+        description="Close sockets that sent nothing, not even a pong, for this long (0 disables; "
+        "when set, clients must answer {\"type\": \"ping\"} frames)",
+    )
+    WS_PROTOCOL_PING_INTERVAL_SECONDS: float = Field(
+        20, description="WebSocket protocol pings sent by the server to detect dead peers"
+    )
+    WS_PROTOCOL_PING_TIMEOUT_SECONDS: float = Field(
+        20, description="Close a socket whose peer does not answer a protocol ping in time"
+    )
+    WS_MAX_SOCKETS_PER_USER: int = Field(
+        5, description="Sockets one user may hold on a worker; the oldest is closed beyond it (0 = no cap)"
+    )
+    WS_MAX_SOCKETS_PER_ROOM: int = Field(
+        20, description="Sockets a room may hold on a worker; new ones are refused beyond it (0 = no cap)"
+    )
+    WS_EPHEMERAL_MIN_INTERVAL_MS: int = Field(
+        1000, description="Minimum gap between typing events of the same kind from one socket"
+    )
+    WS_REPLAY_BUFFER_SIZE: int = Field(
+        200, description="Recent messages kept per room for resuming clients"
+    )
+    WS_REPLAY_ROOMS: int = Field(
+        1000, description="Rooms whose recent messages are kept (least recently active dropped)"
+    )
+    WS_REPLAY_LIMIT: int = Field(
+        200, description="Most messages replayed on one reconnect before the client must page"
+    )
+    WS_TICKET_SECRET: Optional[str] = Field(
+        None,
+        description="HS256 key for WebSocket tickets; must be shared by all workers",
+    )
+    WS_TICKET_TTL_SECONDS: int = Field(
+        120, description="Lifetime of a WebSocket ticket (reusable for reconnects)"
+    )
+    CHAT_MEMBERSHIP_CACHE_TTL_SECONDS: float = Field(
+        60, description="How long a confirmed (chat_id, user_id) membership is cached"
+    )
+    CHAT_MEMBERSHIP_CACHE_MAXSIZE: int = Field(
+        50000, description="Maximum cached memberships per process (0 disables)"
+    )
+    CHAT_WRITE_BEHIND: bool = Field(
+        False,
+        description="Broadcast chat messages immediately and persist them in batches",
+    )
+    CHAT_WRITE_BEHIND_BATCH_SIZE: int = Field(
+        200, description="Pending messages that trigger an immediate batch insert"
+    )
+    CHAT_WRITE_BEHIND_INTERVAL_MS: int = Field(
+        250, description="Longest a pending message waits before being flushed"
+    )
+    CHAT_WRITE_BEHIND_MAX_PENDING: int = Field(
+        10000, description="Pending messages at which senders wait for a flush"
+    )
+    CHAT_BACKPLANE: str = Field(
+        "memory",
+        description="Cross-worker fan-out: 'memory' (single worker) or 'postgres' (LISTEN/NOTIFY)",
+    )
+    CHAT_BACKPLANE_DSN: Optional[str] = Field(
+        None,
+        description="Direct (non-pooler) Postgres URI for LISTEN; defaults to DATABASE_URI",
+    )
+    CHAT_BACKPLANE_CHANNEL: str = Field(
+        "chat_events", description="NOTIFY channel shared by all workers"
+    )
+    CHAT_BACKPLANE_KEEPALIVE_SECONDS: float = Field(
+        30, description="How often the LISTEN connection is checked and re-opened if lost"
+    )
+
+    # Upload settings
+    SCAN_UPLOAD_DIR: str = Field(
+        "uploads/scans",
+        description="Root of the content-addressed scan image store (uploads staged in its tmp/)",
+    )
+    SCAN_MAX_UPLOAD_BYTES: int = Field(
+        15 * 1024 * 1024, description="Largest accepted scan image; checked while streaming"
+    )
+    UPLOAD_CHUNK_SIZE: int = Field(
+        256 * 1024, description="Bytes read and written per step when storing an upload"
+    )
+
+    # Prediction settings
+    SCAN_MODEL_VERSION: str = Field(
+        "v0", description="Version of the scan model; cached predictions are keyed by it"
+    )
+    PREDICTION_CACHE_MAXSIZE: int = Field(
+        10000, description="Predictions kept in memory per worker (LRU eviction, 0 disables)"
+    )
+    PREDICTION_CACHE_TTL_SECONDS: float = Field(
+        86400, description="Seconds a prediction stays in memory; the database tier does not expire"
+    )
+
+    # Scan job settings
+    SCAN_JOB_MODE: bool = Field(
+        False,
+        description="Answer scan uploads with 202 and a job id; inference runs in the worker pool",
+    )
+    SCAN_JOB_CONCURRENCY: int = Field(2, description="Scan jobs run at once per worker process")
+    SCAN_JOB_QUEUE_DEPTH: int = Field(
+        100, description="Unfinished scan jobs at which new uploads are refused with 503"
+    )
+    SCAN_JOB_MAX_ATTEMPTS: int = Field(
+        3, description="Runs of a scan job before it is marked failed"
+    )
+    SCAN_JOB_RETRY_BACKOFF_SECONDS: float = Field(
+        5, description="Delay before the first retry; doubled on each further attempt"
+    )
+    SCAN_JOB_TIMEOUT_SECONDS: float = Field(
+        120, description="Longest one inference may run; a running job older than twice this is re-queued"
+    )
+    SCAN_JOB_POLL_INTERVAL_SECONDS: float = Field(
+        2, description="How often the database is checked for due retries and abandoned jobs"
+    )
+
     # Server settings
     SERVER_PORT: int = Field(9213, description="Port on which the server runs")
 
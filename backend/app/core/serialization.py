@@ -0,0 +1,31 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+
+# Same options FastAPI's ORJSONResponse uses for REST responses
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    # orjson handles UUID, datetime, enum and dataclasses natively
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+def dumps_text(obj: Any) -> str:
+    """Encoded once, ready for any number of WebSocket text frames."""
+    return dumps(obj).decode()
+
+
+loads = orjson.loads
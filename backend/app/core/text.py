@@ -0,0 +1,64 @@
+import re
+from html import escape
+from typing import Optional
+
+# Harakat, Quranic marks, superscript alef and tatweel
+_ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+
+_ARABIC_FOLD = str.maketrans(
+    {
+        "\u0623": "\u0627",  # alef with hamza above -> alef
+        "\u0625": "\u0627",  # alef with hamza below -> alef
+        "\u0622": "\u0627",  # alef with madda -> alef
+        "\u0671": "\u0627",  # alef wasla -> alef
+        "\u0649": "\u064a",  # alef maksura -> yaa
+        "\u0626": "\u064a",  # yaa with hamza -> yaa
+        "\u0624": "\u0648",  # waw with hamza -> waw
+        "\u0629": "\u0647",  # taa marbuta -> haa
+        # Arabic-Indic and Persian digits, so "١٢٠" finds "120"
+        **{chr(0x0660 + i): str(i) for i in range(10)},
+        **{chr(0x06F0 + i): str(i) for i in range(10)},
+    }
+)
+
+_WHITESPACE = re.compile(r"\s+")
+# A word as the full-text tokenizers see it, with its Arabic marks attached
+_WORD = re.compile(r"(?:\w|%s)+" % _ARABIC_MARKS.pattern)
+
+
+def normalize_search_text(text: Optional[str]) -> Optional[str]:
+    """
+    Fold text for full-text matching: drop diacritics and tatweel, unify
+    alef/yaa/taa-marbuta variants, map Arabic digits to ASCII, lowercase.
+    Applied both to stored messages and to search queries.
+    """
+    if text is None:
+        return None
+    text = _ARABIC_MARKS.sub("", text).translate(_ARABIC_FOLD).lower()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def highlight(text: str, terms: str, max_words: int) -> str:
+    """
+    HTML snippet of `text` around its first match: up to `max_words` words
+    of the original text, escaped, with every word whose folded form is
+    one of the (already normalized) `terms` wrapped in <b></b>.
+    """
+    wanted = set(terms.split())
+    words = list(_WORD.finditer(text))
+    if not words:
+        return escape(text)
+    hits = {i for i, word in enumerate(words) if normalize_search_text(word.group()) in wanted}
+    first = min(hits, default=0)
+    start = max(0, min(first - 2, len(words) - max_words))
+    end = min(len(words), start + max_words)
+    parts = ["…"] if start > 0 else []
+    position = words[start].start() if start > 0 else 0
+    for i in range(start, end):
+        word = words[i]
+        parts.append(escape(text[position : word.start()]))
+        marked = escape(word.group())
+        parts.append(f"<b>{marked}</b>" if i in hits else marked)
+        position = word.end()
+    parts.append(escape(text[position:]) if end == len(words) else "…")
+    return "".join(parts)
@@ -1,15 +1,25 @@
 from datetime import datetime
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar
 from uuid import UUID
 
 from pydantic import BaseModel
-from sqlalchemy import update
+from sqlalchemy import delete, insert, select, tuple_, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
+from crud.cache import TTLCache
+from crud.pagination import decode_cursor, next_cursor
+from database import PRIMARY, defers_commit, mark_failed, on_commit, run_after_commit
 from logger import get_logger
 
 T = TypeVar("T", bound=BaseModel)
+S = TypeVar("S", bound=BaseModel)
+
+
+def _chunks(items: Sequence[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
 
 
 class Base:
@@ -21,19 +31,111 @@ class Base:
 
 
 class BaseCRUD(Generic[T]):
-    def __init__(self, model: Type[Base], db_session: Session):
+    def __init__(
+        self,
+        model: Type[Base],
+        db_session: AsyncSession,
+        cache: Optional[TTLCache] = None,
+    ):
         self.model = model
         self.db_session = db_session
+        self.cache = cache
         self.logger = get_logger()
 
+    def _cache_key(self, obj_id: Any) -> Tuple[str, str]:
+        return self.model.__tablename__, str(obj_id)
+
+    def _cache_store(self, obj: Any) -> None:
+        key = self._cache_key(obj.id)
+        values = {
+            attr.key: getattr(obj, attr.key)
+            for attr in self.model.__mapper__.column_attrs
+        }
+        if defers_commit(self.db_session) and self.db_session.info.get("wrote"):
+            # The row may carry flushed but uncommitted changes: cache it only
+            # once they are committed, so a rolled back request leaves no trace
+            cache = self.cache
+            on_commit(self.db_session, lambda: cache.set(key, values))
+            return
+        self.cache.set(key, values)
+
+    def _cache_invalidate(self, *obj_ids: Any) -> None:
+        if self.cache is None:
+            return
+        keys = [self._cache_key(obj_id) for obj_id in obj_ids]
+        for key in keys:
+            self.cache.invalidate(key)
+        if defers_commit(self.db_session) and self.db_session.in_transaction():
+            # Drop anything re-cached from the old row before the commit landed
+            cache = self.cache
+            on_commit(self.db_session, lambda: [cache.invalidate(k) for k in keys])
+
+    async def _commit(self, commit: Optional[bool] = None) -> None:
+        """
+        Commit now, or only flush when the session is in unit-of-work mode
+        and the caller did not ask for an explicit commit.
+        """
+        if commit is None:
+            commit = not defers_commit(self.db_session)
+        if commit:
+            await self.db_session.commit()
+            # an explicit commit inside a unit of work (e.g. a WebSocket that
+            # lives for hours) settles everything deferred so far
+            run_after_commit(self.db_session)
+        else:
+            await self.db_session.flush()
+
+    async def _rollback(self) -> None:
+        await self.db_session.rollback()
+        # A unit of work that lost part of its writes must not commit the rest
+        mark_failed(self.db_session)
+
+    def _select(self, schema: Optional[Type[BaseModel]] = None, extra: Sequence[str] = ()):
+        """
+        SELECT for full ORM entities, or, when `schema` is given, only the
+        columns backing its fields (plus `extra` keys such as sort columns).
+        """
+        if schema is None:
+            return select(self.model)
+        column_attrs = self.model.__mapper__.column_attrs
+        names = dict.fromkeys([*schema.model_fields, *extra])
+        return select(*[getattr(self.model, n) for n in names if n in column_attrs])
+
+    async def _fetch(self, query, schema: Optional[Type[BaseModel]] = None) -> List[Any]:
+        if schema is None:
+            return list((await self.db_session.scalars(query)).all())
+        # Plain rows: no identity map or change tracking involved
+        return list((await self.db_session.execute(query)).all())
+
+    @staticmethod
+    def _to_schema(rows: Sequence[Any], schema: Optional[Type[S]]) -> List[Any]:
+        if schema is None:
+            return list(rows)
+        return [schema.model_validate(row, from_attributes=True) for row in rows]
+
     async def get_by_id(self, obj_id: UUID) -> Optional[T]:
-        """Retrieve an object by its ID."""
+        """
+        Retrieve an object by its ID. With a cache configured, hits return a
+        detached copy of the cached row without touching the database.
+        """
+        if self.cache is not None:
+            values = self.cache.get(self._cache_key(obj_id))
+            if values is not None:
+                return self.model(**values)
         try:
-            return (
-                self.db_session.query(self.model)
-                .filter(self.model.id == obj_id)
-                .first()
-            )
+            if self.cache is None:
+                return await self.db_session.get(self.model, obj_id)
+            # Misses read the primary: a lagging replica could return the
+            # row an update just invalidated, to be cached for the full TTL
+            obj = (
+                await self.db_session.scalars(
+                    select(self.model).where(self.model.id == obj_id),
+                    bind_arguments=PRIMARY,
+                )
+            ).first()
+            if obj is not None:
+                self._cache_store(obj)
+            return obj
         except SQLAlchemyError as e:
             self.logger.error(
                 "SQLAlchemyError in get_by_id: %s",
@@ -53,12 +155,12 @@ class BaseCRUD(Generic[T]):
             return None
 
         try:
-            result = (
-                self.db_session.query(self.model)
-                .filter(getattr(self.model, field_name) == value)
-                .first()
+            result = await self.db_session.scalars(
+                select(self.model)
+                .where(getattr(self.model, field_name) == value)
+                .limit(1)
             )
-            return result
+            return result.first()
         except SQLAlchemyError as e:
             self.logger.error(
                 "SQLAlchemyError in get_by_field: %s",
@@ -71,8 +173,13 @@ class BaseCRUD(Generic[T]):
             )
             return None
 
-    async def get_all_by_field(self, field_name: str, value: Any) -> List[T]:
-        """Retrieve all objects by a specific field."""
+    async def get_all_by_field(
+        self, field_name: str, value: Any, schema: Optional[Type[S]] = None
+    ) -> List[T]:
+        """
+        Retrieve all objects by a specific field, optionally projected
+        straight into `schema`.
+        """
         if not hasattr(self.model, field_name):
             self.logger.error(
                 "Invalid field: %s does not exist in table %s",
@@ -82,12 +189,11 @@ class BaseCRUD(Generic[T]):
             return []
 
         try:
-            results = (
-                self.db_session.query(self.model)
-                .filter(getattr(self.model, field_name) == value)
-                .all()  # Use `.all()` to retrieve all matching rows
+            rows = await self._fetch(
+                self._select(schema).where(getattr(self.model, field_name) == value),
+                schema,
             )
-            return results
+            return self._to_schema(rows, schema)
         except SQLAlchemyError as e:
             self.logger.error(
                 "SQLAlchemyError in get_all_by_field: %s",
@@ -101,15 +207,20 @@ class BaseCRUD(Generic[T]):
             return []
 
     async def get_all(
-        self, skip: int = 0, limit: int = 100, filters: Optional[Dict[str, Any]] = None
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        filters: Optional[Dict[str, Any]] = None,
+        schema: Optional[Type[S]] = None,
     ) -> List[T]:
-        """Retrieve all objects with optional pagination and filtering."""
+        """Retrieve all objects with optional pagination, filtering and projection."""
         try:
-            query = self.db_session.query(self.model)
+            query = self._select(schema)
             if filters:
                 for key, value in filters.items():
-                    query = query.filter(getattr(self.model, key) == value)
-            return query.offset(skip).limit(limit).all()
+                    query = query.where(getattr(self.model, key) == value)
+            rows = await self._fetch(query.offset(skip).limit(limit), schema)
+            return self._to_schema(rows, schema)
         except SQLAlchemyError as e:
             self.logger.error(
                 "SQLAlchemyError in get_all: %s",
@@ -123,16 +234,68 @@ class BaseCRUD(Generic[T]):
             )
             return []
 
-    async def create(self, data: Dict[str, Any]) -> Optional[T]:
-        """Create a new object."""
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        order_by: Sequence[str] = ("created_at", "id"),
+        descending: bool = False,
+        filters: Optional[Dict[str, Any]] = None,
+        criteria: Sequence[Any] = (),
+        schema: Optional[Type[S]] = None,
+    ) -> Tuple[List[T], Optional[str]]:
+        """
+        Retrieve one keyset page ordered on `order_by` (which should end in a
+        unique column) and return it with the cursor for the next page.
+        With `schema`, only its columns are selected and rows are mapped into it.
+
+        Raises InvalidCursorError if `cursor` was not issued for this ordering.
+        """
+        columns = [getattr(self.model, key) for key in order_by]
+        query = self._select(schema, extra=order_by).where(*criteria)
+        if filters:
+            for key, value in filters.items():
+                query = query.where(getattr(self.model, key) == value)
+        if cursor:
+            values = decode_cursor(cursor, order_by, columns)
+            if descending:
+                query = query.where(tuple_(*columns) < tuple_(*values))
+            else:
+                query = query.where(tuple_(*columns) > tuple_(*values))
+        query = query.order_by(
+            *[c.desc() if descending else c.asc() for c in columns]
+        ).limit(limit + 1)
         try:
-            obj = self.model(**data)
-            self.db_session.add(obj)
-            self.db_session.commit()
-            self.db_session.refresh(obj)
+            rows = await self._fetch(query, schema)
+        except SQLAlchemyError as e:
+            self.logger.error(
+                "SQLAlchemyError in get_page: %s",
+                e,
+                extra={
+                    "table": self.model.__tablename__,
+                    "limit": limit,
+                    "filters": filters,
+                },
+            )
+            return [], None
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = next_cursor(rows[-1] if rows else None, order_by, has_more)
+        return self._to_schema(rows, schema), cursor
+
+    async def create(
+        self, data: Dict[str, Any], commit: Optional[bool] = None
+    ) -> Optional[T]:
+        """Create a new object with a single INSERT ... RETURNING."""
+        try:
+            result = await self.db_session.scalars(
+                insert(self.model).values(**data).returning(self.model)
+            )
+            obj = result.one()
+            await self._commit(commit)
             return obj
         except SQLAlchemyError as e:
-            self.db_session.rollback()
+            await self._rollback()
             self.logger.error(
                 "SQLAlchemyError in create: %s",
                 e,
@@ -140,7 +303,9 @@ class BaseCRUD(Generic[T]):
             )
             return None
 
-    async def update(self, obj_id: UUID, data: Dict[str, Any]) -> Optional[T]:
+    async def update(
+        self, obj_id: UUID, data: Dict[str, Any], commit: Optional[bool] = None
+    ) -> Optional[T]:
         """Update an existing object."""
         try:
             # Exclude "id" from updates
@@ -150,33 +315,25 @@ class BaseCRUD(Generic[T]):
             if hasattr(self.model, "updated_at"):
                 data["updated_at"] = datetime.utcnow()
 
-            # Perform the update using SQLAlchemy's update construct
+            # UPDATE ... RETURNING hands back the new row in the same round trip
             stmt = (
                 update(self.model)
                 .where(self.model.id == obj_id)
                 .values(**data)
-                .execution_options(
-                    synchronize_session="fetch"
-                )  # Ensures session consistency
+                .returning(self.model)
+                .execution_options(populate_existing=True)
             )
 
-            result = self.db_session.execute(stmt)
-            self.db_session.commit()
+            result = await self.db_session.scalars(stmt)
+            updated_obj = result.one_or_none()
+            await self._commit(commit)
+            self._cache_invalidate(obj_id)
 
-            # If no rows were updated, the object doesn't exist
-            if result.rowcount == 0:
-                return None
-
-            # Fetch and return the updated object if needed
-            updated_obj = (
-                self.db_session.query(self.model)
-                .filter(self.model.id == obj_id)
-                .first()
-            )
+            # None when no row matched, i.e. the object doesn't exist
             return updated_obj
 
         except SQLAlchemyError as e:
-            self.db_session.rollback()
+            await self._rollback()
             self.logger.error(
                 "SQLAlchemyError in update: %s",
                 e,
@@ -188,21 +345,145 @@ class BaseCRUD(Generic[T]):
             )
             return None
 
-    async def delete(self, obj_id: UUID) -> None:
-        """Delete an object."""
+    async def delete(self, obj_id: UUID, commit: Optional[bool] = None) -> bool:
+        """
+        Delete an object with a single DELETE statement.
+
+        Returns False if no row matched. Child rows are removed by the
+        database (ON DELETE CASCADE), not by ORM cascades.
+        """
         try:
-            obj = (
-                self.db_session.query(self.model)
-                .filter(self.model.id == obj_id)
-                .first()
+            result = await self.db_session.execute(
+                delete(self.model).where(self.model.id == obj_id)
             )
-            if obj:
-                self.db_session.delete(obj)
-                self.db_session.commit()
+            await self._commit(commit)
+            self._cache_invalidate(obj_id)
+            return result.rowcount > 0
         except SQLAlchemyError as e:
-            self.db_session.rollback()
+            await self._rollback()
             self.logger.error(
                 "SQLAlchemyError in delete: %s",
                 e,
                 extra={"table": self.model.__tablename__, "id": str(obj_id)},
             )
+            return False
+
+    async def bulk_create(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
+        commit: Optional[bool] = None,
+    ) -> List[T]:
+        """
+        Insert many objects with multi-row INSERT ... RETURNING, committing
+        once per chunk (pass commit=True inside a unit of work). Stops at the first failing chunk and returns the
+        objects created so far.
+        """
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        created: List[T] = []
+        for chunk in _chunks(list(rows), chunk_size):
+            try:
+                result = await self.db_session.scalars(
+                    insert(self.model).returning(self.model), chunk
+                )
+                objs = list(result.all())
+                await self._commit(commit)
+                # a later chunk's rollback would expire them; callers still read them
+                for obj in objs:
+                    self.db_session.expunge(obj)
+                created.extend(objs)
+            except SQLAlchemyError as e:
+                await self._rollback()
+                self.logger.error(
+                    "SQLAlchemyError in bulk_create: %s",
+                    e,
+                    extra={
+                        "table": self.model.__tablename__,
+                        "rows_created": len(created),
+                        "requested": len(rows),
+                    },
+                )
+                break
+        return created
+
+    async def bulk_update(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
+        commit: Optional[bool] = None,
+    ) -> List[Any]:
+        """
+        Update many objects by primary key; every row must carry its "id".
+        Runs as an executemany UPDATE per chunk, one transaction per chunk.
+        Returns the ids actually updated in successfully committed chunks;
+        unknown ids and rows with nothing to set are left out.
+        """
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        now = datetime.utcnow() if hasattr(self.model, "updated_at") else None
+        prepared = [
+            {**row, "updated_at": now} if now is not None else dict(row)
+            for row in rows
+            if row.get("id") is not None and len(row) > 1
+        ]
+        updated: List[Any] = []
+        for chunk in _chunks(prepared, chunk_size):
+            ids = [row["id"] for row in chunk]
+            try:
+                # executemany has no reliable rowcount: lock the rows that exist first
+                found = set(
+                    await self.db_session.scalars(
+                        select(self.model.id).where(self.model.id.in_(ids)).with_for_update()
+                    )
+                )
+                matched = [row for row in chunk if row["id"] in found]
+                if matched:
+                    await self.db_session.execute(update(self.model), matched)
+                await self._commit(commit)
+                self._cache_invalidate(*ids)
+                updated.extend(row["id"] for row in matched)
+            except SQLAlchemyError as e:
+                await self._rollback()
+                self.logger.error(
+                    "SQLAlchemyError in bulk_update: %s",
+                    e,
+                    extra={
+                        "table": self.model.__tablename__,
+                        "rows_updated": len(updated),
+                        "requested": len(rows),
+                    },
+                )
+                break
+        return updated
+
+    async def bulk_delete(
+        self,
+        obj_ids: Sequence[UUID],
+        chunk_size: Optional[int] = None,
+        commit: Optional[bool] = None,
+    ) -> int:
+        """Delete many objects with one DELETE ... WHERE id IN (...) per chunk."""
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        deleted = 0
+        for chunk in _chunks(list(obj_ids), chunk_size):
+            try:
+                result = await self.db_session.execute(
+                    delete(self.model)
+                    .where(self.model.id.in_(chunk))
+                    .execution_options(synchronize_session=False)
+                )
+                await self._commit(commit)
+                self._cache_invalidate(*chunk)
+                deleted += result.rowcount
+            except SQLAlchemyError as e:
+                await self._rollback()
+                self.logger.error(
+                    "SQLAlchemyError in bulk_delete: %s",
+                    e,
+                    extra={
+                        "table": self.model.__tablename__,
+                        "rows_deleted": deleted,
+                        "requested": len(obj_ids),
+                    },
+                )
+                break
+        return deleted
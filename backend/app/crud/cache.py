@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from core.config import settings
+
+
+class TTLCache:
+    """
+    In-process LRU cache whose entries also expire after `ttl` seconds.
+    Keeps hit/miss/eviction counters for the health endpoint.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        registry[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+registry: Dict[str, TTLCache] = {}
+
+
+def cache_statistics() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in registry.items()}
+
+
+# Shared read-through cache for BaseCRUD.get_by_id, keyed by (table, id).
+# Per process: other workers only see a change once their entry expires.
+entity_cache: Optional[TTLCache] = (
+    TTLCache(
+        "entities",
+        maxsize=settings.ENTITY_CACHE_MAXSIZE,
+        ttl=settings.ENTITY_CACHE_TTL_SECONDS,
+    )
+    if settings.ENTITY_CACHE_ENABLED
+    else None
+)
+
+# Confirmed chat participants, keyed by (chat_id, user_id). Only positive
+# answers are stored; ChatService.delete_chat invalidates them.
+membership_cache = TTLCache(
+    "chat_membership",
+    maxsize=settings.CHAT_MEMBERSHIP_CACHE_MAXSIZE,
+    ttl=settings.CHAT_MEMBERSHIP_CACHE_TTL_SECONDS,
+)
+
+# Model output per (image sha256, model version). Entries never go stale for
+# a given version; the TTL only bounds memory. Backed by scan_predictions.
+prediction_cache = TTLCache(
+    "scan_predictions",
+    maxsize=settings.PREDICTION_CACHE_MAXSIZE,
+    ttl=settings.PREDICTION_CACHE_TTL_SECONDS,
+)
@@ -1,35 +1,281 @@
-from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, case, column, func, literal_column, or_, select, table, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from uuid import UUID
 from crud.base_crud import BaseCRUD
-from models import Chat, Message
-from schemas.chat import MessageCreate
+from core.text import highlight, normalize_search_text
+from crud.pagination import decode_cursor, encode_cursor
+from database import engine
+from models import Chat, Message, User
+from models.message import with_search_text
+from schemas.chat import InboxEntry, MessageCreate, MessageSearchHit
+
+INBOX_KEYS = ("last_message_at", "id")
+INBOX_PREVIEW_CHARS = 120
+SEARCH_KEYS = ("offset",)
+SNIPPET_WORDS = 12
 
 class ConversationCRUD(BaseCRUD[Chat]):
-    pass
+    async def get_participants(self, chat_id: UUID) -> Optional[Tuple[UUID, UUID]]:
+        """(customer_id, merchant_id) of a chat, without loading the whole row."""
+        row = (
+            await self.db_session.execute(
+                select(Chat.customer_id, Chat.merchant_id).where(Chat.id == chat_id)
+            )
+        ).one_or_none()
+        return tuple(row) if row is not None else None
+
+    async def record_messages(
+        self, messages: Sequence[Dict[str, Any]], commit: Optional[bool] = None
+    ) -> None:
+        """
+        Advance each chat's last message past newly inserted `messages`
+        (dicts with id, chat_id, sender_id, created_at) and move the
+        sender's own read cursor along. One UPDATE per chat.
+
+        Unlike the generic writes this re-raises: the caller's message
+        insert shares the transaction and must not commit without it.
+        """
+        latest: Dict[Any, Dict[str, Any]] = {}
+        for msg in messages:
+            current = latest.get(msg["chat_id"])
+            if current is None or (msg["created_at"], msg["id"]) > (current["created_at"], current["id"]):
+                latest[msg["chat_id"]] = msg
+        try:
+            for chat_id, msg in latest.items():
+                at, sender = msg["created_at"], msg["sender_id"]
+                await self.db_session.execute(
+                    update(Chat)
+                    .where(Chat.id == chat_id, Chat.last_message_at <= at)
+                    .values(
+                        last_message_at=at,
+                        last_message_id=msg["id"],
+                        customer_last_read_at=case(
+                            (Chat.customer_id == sender, at), else_=Chat.customer_last_read_at
+                        ),
+                        merchant_last_read_at=case(
+                            (Chat.merchant_id == sender, at), else_=Chat.merchant_last_read_at
+                        ),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            self._cache_invalidate(*latest)
+            await self._commit(commit)
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in record_messages: %s", e)
+            raise
+
+    async def mark_read(
+        self, chat_id: UUID, user_id: UUID, commit: Optional[bool] = None
+    ) -> bool:
+        """Move the user's read cursor up to the chat's last message."""
+        try:
+            result = await self.db_session.execute(
+                update(Chat)
+                .where(
+                    Chat.id == chat_id,
+                    or_(Chat.customer_id == user_id, Chat.merchant_id == user_id),
+                )
+                .values(
+                    customer_last_read_at=case(
+                        (Chat.customer_id == user_id, Chat.last_message_at),
+                        else_=Chat.customer_last_read_at,
+                    ),
+                    merchant_last_read_at=case(
+                        (Chat.merchant_id == user_id, Chat.last_message_at),
+                        else_=Chat.merchant_last_read_at,
+                    ),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self._cache_invalidate(chat_id)
+            await self._commit(commit)
+            return result.rowcount > 0
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in mark_read: %s", e)
+            return False
+
+    async def list_inbox(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[InboxEntry], Optional[str]]:
+        """
+        The user's conversations by latest activity, each with the
+        counterparty's name, a preview of the last message and the number
+        of messages from the other side since the user's read cursor, all
+        in one query (the unread count is a correlated subquery on the
+        (chat_id, created_at, id) message index).
+
+        Raises InvalidCursorError if `cursor` was not issued by this method.
+        """
+        is_customer = Chat.customer_id == user_id
+        counterparty_id = case((is_customer, Chat.merchant_id), else_=Chat.customer_id)
+        read_at = case((is_customer, Chat.customer_last_read_at), else_=Chat.merchant_last_read_at)
+        counterparty = aliased(User)
+        last_message = aliased(Message)
+        unread = aliased(Message)
+
+        unread_count = (
+            select(func.count())
+            .select_from(unread)
+            .where(
+                unread.chat_id == Chat.id,
+                unread.sender_id != user_id,
+                or_(read_at.is_(None), unread.created_at > read_at),
+            )
+            .correlate(Chat)
+            .scalar_subquery()
+        )
+        query = (
+            select(
+                Chat.id.label("chat_id"),
+                counterparty_id.label("counterparty_id"),
+                counterparty.name.label("counterparty_name"),
+                Chat.last_message_at,
+                Chat.last_message_id,
+                last_message.sender_id.label("last_message_sender_id"),
+                func.substr(last_message.content, 1, INBOX_PREVIEW_CHARS).label("last_message_preview"),
+                last_message.image_url.label("last_message_image_url"),
+                unread_count.label("unread_count"),
+            )
+            .outerjoin(counterparty, counterparty.id == counterparty_id)
+            .outerjoin(last_message, last_message.id == Chat.last_message_id)
+            .where(or_(Chat.customer_id == user_id, Chat.merchant_id == user_id))
+        )
+        columns = [Chat.last_message_at, Chat.id]
+        if cursor:
+            values = decode_cursor(cursor, INBOX_KEYS, columns)
+            query = query.where(tuple_(*columns) < tuple_(*values))
+        query = query.order_by(*[c.desc() for c in columns]).limit(limit + 1)
+
+        rows = (await self.db_session.execute(query)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = (
+            encode_cursor(INBOX_KEYS, [rows[-1].last_message_at, rows[-1].chat_id])
+            if has_more
+            else None
+        )
+        return [InboxEntry.model_validate(row, from_attributes=True) for row in rows], next_cursor
 
 class MessageCRUD(BaseCRUD[Message]):
-    pass
+    async def update(
+        self, obj_id: UUID, data: Dict[str, Any], commit: Optional[bool] = None
+    ) -> Optional[Message]:
+        return await super().update(obj_id, with_search_text(data), commit=commit)
+
+    async def bulk_update(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
+        commit: Optional[bool] = None,
+    ) -> List[Any]:
+        return await super().bulk_update(
+            [with_search_text(row) for row in rows], chunk_size=chunk_size, commit=commit
+        )
+
+    async def search(
+        self,
+        user_id: UUID,
+        query: str,
+        chat_id: Optional[UUID] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[MessageSearchHit], Optional[str]]:
+        """
+        Best-matching messages first, limited to chats the user takes part
+        in (and to `chat_id` when given). The query is normalized like the
+        indexed text. Postgres matches a GIN-indexed tsvector; SQLite uses
+        the messages_fts FTS5 table. Ranked results page by offset.
+        Snippets are cut from the original content, not the folded text.
+
+        Raises InvalidCursorError if `cursor` was not issued by this method.
+        """
+        terms = normalize_search_text(query)
+        if not terms:
+            return [], None
+        offset = decode_cursor(cursor, SEARCH_KEYS, [column("offset", Integer)])[0] if cursor else 0
 
-def create_conversation(db: Session, customer_id: UUID, merchant_id: UUID):
+        my_chats = select(Chat.id).where(
+            or_(Chat.customer_id == user_id, Chat.merchant_id == user_id)
+        )
+        if engine.dialect.name == "sqlite":
+            fts_table = table("messages_fts", column("rowid"))
+            fts = literal_column("messages_fts")
+            # Quote every word so user input cannot use FTS5 query syntax
+            match = " ".join('"%s"' % word.replace('"', '""') for word in terms.split())
+            rank = -func.bm25(fts)
+            stmt = (
+                select(Message.id, Message.chat_id, Message.sender_id, Message.created_at,
+                       Message.content, rank.label("rank"))
+                .select_from(Message)
+                .join(fts_table, fts_table.c.rowid == literal_column("messages.rowid"))
+                .where(fts.op("MATCH")(match))
+            )
+        else:
+            vector = func.to_tsvector(literal_column("'simple'"), Message.search_text)
+            tsquery = func.plainto_tsquery(literal_column("'simple'"), terms)
+            rank = func.ts_rank(vector, tsquery)
+            stmt = select(
+                Message.id, Message.chat_id, Message.sender_id, Message.created_at,
+                Message.content, rank.label("rank"),
+            ).where(vector.op("@@")(tsquery))
+
+        stmt = stmt.where(Message.chat_id.in_(my_chats))
+        if chat_id is not None:
+            stmt = stmt.where(Message.chat_id == chat_id)
+        stmt = (
+            stmt.order_by(rank.desc(), Message.created_at.desc(), Message.id)
+            .offset(offset)
+            .limit(limit + 1)
+        )
+        rows = (await self.db_session.execute(stmt)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(SEARCH_KEYS, [offset + limit]) if has_more else None
+        hits = [
+            MessageSearchHit(
+                id=row.id,
+                chat_id=row.chat_id,
+                sender_id=row.sender_id,
+                created_at=row.created_at,
+                snippet=highlight(row.content, terms, SNIPPET_WORDS) if row.content else None,
+                rank=row.rank,
+            )
+            for row in rows
+        ]
+        return hits, next_cursor
+
+async def create_conversation(db: AsyncSession, customer_id: UUID, merchant_id: UUID):
     crud = ConversationCRUD(Chat, db)
-    return db.sync_session  # placeholder for BaseCRUD create (sync override)
+    return await crud.create({"customer_id": customer_id, "merchant_id": merchant_id})
 
-# Simpler explicit functions (async not needed)
+# Simpler explicit functions
 
-def list_conversations(db: Session, user_id: UUID):
-    return db.query(Chat).filter((Chat.customer_id == user_id) | (Chat.merchant_id == user_id)).all()
+async def list_conversations(db: AsyncSession, user_id: UUID):
+    result = await db.scalars(
+        select(Chat).where((Chat.customer_id == user_id) | (Chat.merchant_id == user_id))
+    )
+    return list(result.all())
 
-def create_message(db: Session, payload: MessageCreate, sender_id: UUID, image_url: str | None = None):
+async def create_message(db: AsyncSession, payload: MessageCreate, sender_id: UUID, image_url: str | None = None):
     msg = Message(
-        conversation_id=payload.conversation_id,
+        chat_id=payload.conversation_id,
         sender_id=sender_id,
         content=payload.content,
         image_url=image_url,
     )
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    await db.commit()
+    await db.refresh(msg)
     return msg
 
-def list_messages(db: Session, conversation_id: UUID):
-    return db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).all()
\ No newline at end of file
+async def list_messages(db: AsyncSession, conversation_id: UUID):
+    result = await db.scalars(
+        select(Message).where(Message.chat_id == conversation_id).order_by(Message.created_at)
+    )
+    return list(result.all())
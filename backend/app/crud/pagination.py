@@ -0,0 +1,65 @@
+import base64
+import enum
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import Column
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded for the given ordering."""
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _from_json(value: Any, column: Column) -> Any:
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if isinstance(value, python_type):
+        return value
+    return python_type(value)
+
+
+def encode_cursor(keys: Sequence[str], values: Sequence[Any]) -> str:
+    """Opaque, URL-safe cursor pointing just past the row holding `values`."""
+    payload = json.dumps(
+        {"k": list(keys), "v": [_to_json(v) for v in values]}, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[str], columns: Sequence[Column]) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["k"] != list(keys) or len(payload["v"]) != len(columns):
+            raise InvalidCursorError("Cursor does not match the requested ordering")
+        return [_from_json(v, c) for v, c in zip(payload["v"], columns)]
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Malformed pagination cursor") from e
+
+
+def next_cursor(row: Any, keys: Sequence[str], has_more: bool) -> Optional[str]:
+    if not has_more or row is None:
+        return None
+    return encode_cursor(keys, [getattr(row, k) for k in keys])
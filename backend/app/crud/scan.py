@@ -1,11 +1,208 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Any, List, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from models import ScanResult
+from crud.base_crud import BaseCRUD
+from database import engine
+from logger import get_logger
+from models import ScanBlob, ScanJob, ScanPrediction, ScanResult
+from storage.blobs import blob_store
+
+logger = get_logger(__name__)
+
+
+def _dialect_insert():
+    return pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
+
+async def lock_blob(conn: Any, digest: str) -> None:
+    """
+    Serialize blob writers and the file collector on one digest until the
+    transaction ends. Postgres only; SQLite already has a single writer.
+    """
+    if engine.dialect.name == "postgresql":
+        await conn.execute(select(func.pg_advisory_xact_lock(func.hashtext(digest))))
+
+
+async def collect_blob(digest: str, path: str) -> None:
+    """
+    Unlink a blob file unless its digest has a scan_blobs row again. Runs on
+    the primary under the digest lock, so it waits for an upload that is
+    placing the same file to commit or roll back.
+    """
+    try:
+        async with engine.begin() as conn:
+            await lock_blob(conn, digest)
+            if await conn.scalar(select(ScanBlob.digest).where(ScanBlob.digest == digest)):
+                return  # referenced again
+            blob_store.remove(path)
+    except Exception as e:
+        logger.warning(f"Could not collect blob {digest}: {e}")
+
+
+class BlobCRUD(BaseCRUD[ScanBlob]):
+    """
+    Reference counts for content-addressed scan images. Both methods
+    re-raise: the scan row they accompany must not commit without them.
+    """
+
+    async def acquire(
+        self, digest: str, path: str, size: int, content_type: str, commit: Optional[bool] = None
+    ) -> None:
+        """
+        Record the blob with one reference, or add a reference if it exists.
+        Call before placing the file: the digest stays locked until commit,
+        so the collector cannot unlink the file in between.
+        """
+        stmt = _dialect_insert()(ScanBlob).values(
+            digest=digest, path=path, size=size, content_type=content_type, ref_count=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ScanBlob.digest],
+            set_={"ref_count": ScanBlob.__table__.c.ref_count + 1},
+        )
+        try:
+            await self.db_session.execute(stmt)
+            # after the upsert, so the session is already pinned to the primary
+            await lock_blob(self.db_session, digest)
+            await self._commit(commit)
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in acquire: %s", e, extra={"digest": digest})
+            raise
+
+    async def release(self, digest: str, commit: Optional[bool] = None) -> Optional[str]:
+        """
+        Drop one reference. When none are left the row is deleted and the
+        blob's path returned, for the caller to unlink after commit.
+        """
+        try:
+            row = (
+                await self.db_session.execute(
+                    update(ScanBlob)
+                    .where(ScanBlob.digest == digest)
+                    .values(ref_count=ScanBlob.ref_count - 1)
+                    .returning(ScanBlob.ref_count, ScanBlob.path)
+                    .execution_options(synchronize_session=False)
+                )
+            ).one_or_none()
+            orphan = None
+            if row is not None and row.ref_count <= 0:
+                await self.db_session.execute(
+                    delete(ScanBlob).where(ScanBlob.digest == digest, ScanBlob.ref_count <= 0)
+                )
+                orphan = row.path
+            await self._commit(commit)
+            return orphan
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in release: %s", e, extra={"digest": digest})
+            raise
+
+
+class PredictionCRUD(BaseCRUD[ScanPrediction]):
+    async def lookup(self, digest: str, model_version: str) -> Optional[str]:
+        try:
+            return await self.db_session.scalar(
+                select(ScanPrediction.prediction).where(
+                    ScanPrediction.digest == digest,
+                    ScanPrediction.model_version == model_version,
+                )
+            )
+        except SQLAlchemyError as e:
+            self.logger.error("SQLAlchemyError in lookup: %s", e, extra={"digest": digest})
+            return None
+
+    async def remember(
+        self, digest: str, model_version: str, prediction: str, commit: Optional[bool] = None
+    ) -> None:
+        """Store a prediction; a concurrent insert of the same key wins."""
+        stmt = (
+            _dialect_insert()(ScanPrediction)
+            .values(digest=digest, model_version=model_version, prediction=prediction)
+            .on_conflict_do_nothing(index_elements=[ScanPrediction.digest, ScanPrediction.model_version])
+        )
+        try:
+            await self.db_session.execute(stmt)
+            await self._commit(commit)
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in remember: %s", e, extra={"digest": digest})
+            raise
+
+
+class ScanJobCRUD(BaseCRUD[ScanJob]):
+    """
+    Claiming is one conditional UPDATE, so a job runs on only one worker
+    even when several processes poll the same table. A job is due when it
+    is queued and its retry time has passed, or when it has been running
+    since before `stale_before` (its worker died).
+    """
+
+    @staticmethod
+    def _due(now: datetime, stale_before: datetime):
+        return or_(
+            and_(ScanJob.status == "queued", ScanJob.available_at <= now),
+            and_(ScanJob.status == "running", ScanJob.updated_at < stale_before),
+        )
+
+    async def count_unfinished(self) -> int:
+        try:
+            return await self.db_session.scalar(
+                select(func.count()).where(ScanJob.status.in_(("queued", "running")))
+            )
+        except SQLAlchemyError as e:
+            self.logger.error("SQLAlchemyError in count_unfinished: %s", e)
+            return 0
+
+    async def due(self, now: datetime, stale_before: datetime, limit: int) -> List[Any]:
+        try:
+            return list(
+                await self.db_session.scalars(
+                    select(ScanJob.id)
+                    .where(self._due(now, stale_before))
+                    .order_by(ScanJob.available_at)
+                    .limit(limit)
+                )
+            )
+        except SQLAlchemyError as e:
+            self.logger.error("SQLAlchemyError in due: %s", e)
+            return []
+
+    async def claim(self, job_id: Any, now: datetime, stale_before: datetime) -> Optional[Any]:
+        """Mark a due job running and return its row, or None if it is not ours to run."""
+        try:
+            row = (
+                await self.db_session.execute(
+                    update(ScanJob)
+                    .where(ScanJob.id == job_id, self._due(now, stale_before))
+                    .values(status="running", attempts=ScanJob.attempts + 1, updated_at=now)
+                    .returning(
+                        ScanJob.id,
+                        ScanJob.user_id,
+                        ScanJob.blob_digest,
+                        ScanJob.image_url,
+                        ScanJob.attempts,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            ).one_or_none()
+            await self.db_session.commit()
+            return row
+        except SQLAlchemyError as e:
+            await self._rollback()
+            self.logger.error("SQLAlchemyError in claim: %s", e, extra={"id": str(job_id)})
+            return None
 
 
-def save_scan(db: Session, user_id: UUID, image_url: str, prediction: str):
+async def save_scan(db: AsyncSession, user_id: UUID, image_url: str, prediction: str):
     scan = ScanResult(user_id=user_id, image_url=image_url, prediction=prediction)
     db.add(scan)
-    db.commit()
-    db.refresh(scan)
+    await db.commit()
+    await db.refresh(scan)
     return scan
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from crud.base_crud import BaseCRUD
 from models import User
@@ -6,6 +6,6 @@ from models import User
 class UserCRUD(BaseCRUD[User]):
     pass
 
-def get_user_crud(db: Session) -> UserCRUD:
+def get_user_crud(db: AsyncSession) -> UserCRUD:
     from app.models import User  # local import to avoid circular
     return UserCRUD(User, db)
\ No newline at end of file
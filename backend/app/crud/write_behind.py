@@ -0,0 +1,173 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+AfterInsert = Callable[[AsyncSession, List[Dict[str, Any]]], Awaitable[None]]
+
+
+class WriteBehindFull(Exception):
+    """The buffer is at `max_pending` and the database did not take a flush."""
+
+
+class WriteBehindBuffer:
+    """
+    Collects fully-formed rows (ids and timestamps already assigned) for one
+    table and inserts them as multi-row batches: as soon as `batch_size` rows
+    are pending, otherwise every `interval` seconds.
+
+    Rows live only in memory until flushed; `stop()` drains what is left,
+    so it must run on shutdown. `after_insert` runs in the same transaction
+    as each batch (e.g. to maintain denormalized columns). Once `max_pending`
+    rows are waiting, `submit` flushes inline and raises WriteBehindFull if
+    that does not make room, so memory stays bounded while the database is
+    down.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: Type[Any],
+        batch_size: int,
+        interval: float,
+        max_pending: int,
+        after_insert: Optional[AfterInsert] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.after_insert = after_insert
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stats_lock = threading.Lock()
+        self.rows_written = 0
+        self.batches = 0
+        self.rows_dropped = 0
+        self.rows_rejected = 0
+        self.retries = 0
+        registry[name] = self
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"{self.name}: {len(self._pending)} rows could not be written on shutdown")
+
+    async def submit(self, row: Dict[str, Any]) -> None:
+        if self._task is not None and len(self._pending) >= self.max_pending:
+            # Back-pressure: the database is falling behind
+            await self.flush()
+            if len(self._pending) >= self.max_pending:
+                with self._stats_lock:
+                    self.rows_rejected += 1
+                raise WriteBehindFull(f"{self.name}: {len(self._pending)} rows waiting for the database")
+        self._pending.append(row)
+        if self._task is None:
+            # Not running under the app lifespan (scripts, tests): write through
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"{self.name}: flush failed: {e}")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[: self.batch_size]
+                del self._pending[: len(batch)]
+                try:
+                    await self._insert(batch)
+                except IntegrityError:
+                    # One bad row must not sink the whole batch
+                    await self._insert_one_by_one(batch)
+                except SQLAlchemyError as e:
+                    # Database unavailable: keep the rows for the next flush
+                    self._pending[:0] = batch
+                    with self._stats_lock:
+                        self.retries += 1
+                    logger.warning(f"{self.name}: batch of {len(batch)} rows deferred: {e}")
+                    return
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(insert(self.model), rows)
+                if self.after_insert is not None:
+                    await self.after_insert(db, rows)
+                await db.commit()
+            except SQLAlchemyError:
+                await db.rollback()
+                raise
+        with self._stats_lock:
+            self.rows_written += len(rows)
+            self.batches += 1
+
+    async def _insert_one_by_one(self, rows: List[Dict[str, Any]]) -> None:
+        for i, row in enumerate(rows):
+            try:
+                await self._insert([row])
+            except IntegrityError as e:
+                with self._stats_lock:
+                    self.rows_dropped += 1
+                logger.error(f"{self.name}: dropping row {row.get('id')}: {e.orig}")
+            except SQLAlchemyError:
+                self._pending[:0] = rows[i:]
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "pending": len(self._pending),
+                "batch_size": self.batch_size,
+                "interval_s": self.interval,
+                "rows_written": self.rows_written,
+                "batches": self.batches,
+                "avg_batch": round(self.rows_written / self.batches, 2) if self.batches else 0.0,
+                "rows_dropped": self.rows_dropped,
+                "rows_rejected": self.rows_rejected,
+                "retries": self.retries,
+            }
+
+
+registry: Dict[str, WriteBehindBuffer] = {}
+
+
+def write_behind_statistics() -> Dict[str, Dict[str, Any]]:
+    return {name: buffer.stats() for name, buffer in registry.items()}
@@ -1,19 +1,154 @@
-from sqlalchemy import create_engine
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session
 
 from core.config import settings
+from db_pool import PoolMetrics, registry
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Sync drivers configured in DATABASE_URI are swapped for their asyncio
+# counterparts so existing .env files keep working.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_uri(uri: str) -> str:
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def engine_options(uri: str, metrics: PoolMetrics) -> Dict[str, Any]:
+    """Pool and timeout options for `create_async_engine`, driven by Settings."""
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options: Dict[str, Any] = {
+        "poolclass": metrics.pool_class(),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS and url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "server_settings": {
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)
+            }
+        }
+    return options
+
+
+def build_engine(uri: str, name: str) -> AsyncEngine:
+    metrics = registry[name] = PoolMetrics(name)
+    async_uri = to_async_uri(uri)
+    new_engine = create_async_engine(
+        async_uri,
+        echo=settings.ECHO_SQL,
+        echo_pool=False,
+        **engine_options(async_uri, metrics),
+    )
+    metrics.attach(new_engine)
+    return new_engine
+
+
+engine = build_engine(settings.DATABASE_URI, "primary")
+replica_engine: Optional[AsyncEngine] = (
+    build_engine(settings.DATABASE_REPLICA_URI, "replica")
+    if settings.DATABASE_REPLICA_URI
+    else None
+)
+
+
+def is_plain_read(clause: Any) -> bool:
+    return (
+        clause is not None
+        and getattr(clause, "is_select", False)
+        and getattr(clause, "_for_update_arg", None) is None
+    )
+
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to the replica and everything else to the primary.
+    Once a session has written (or flushed), it stays on the primary so the
+    rest of the request reads its own writes. A statement executed with
+    `bind_arguments=PRIMARY` always reads the primary.
+    """
 
-engine = create_engine(settings.DATABASE_URI, echo=False, echo_pool=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def get_bind(self, mapper=None, clause=None, bind=None, **kw):
+        if bind is not None:
+            return bind
+        if self.info.get("wrote") or self._flushing or not is_plain_read(clause):
+            self.info["wrote"] = True
+            return engine.sync_engine
+        return replica_engine.sync_engine if replica_engine else engine.sync_engine
+
+
+PRIMARY = {"bind": engine.sync_engine}
+
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+# Backwards compatible name for code that builds sessions outside a request
+SessionLocal = AsyncSessionLocal
 
 Base = declarative_base()
 
 
+# ---- Unit of work: one commit per request instead of one per write ----
+
+def defers_commit(session: Any) -> bool:
+    return session.info.get("unit_of_work", False)
+
+
+def mark_failed(session: Any) -> None:
+    if defers_commit(session):
+        session.info["failed"] = True
+        # what the callbacks were waiting for was rolled back
+        session.info.pop("after_commit", None)
+
+
+def on_commit(session: Any, callback: Callable[[], Any]) -> None:
+    """Run `callback` once the unit of work has committed."""
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+def run_after_commit(session: Any) -> None:
+    """Run, and forget, the callbacks waiting for the commit that just happened."""
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+async def commit_unit_of_work(db: Any) -> None:
+    if db.info.get("failed"):
+        logger.warning("Unit of work had a failed write; rolling back the request")
+        await db.rollback()
+        return
+    if db.info.get("wrote"):
+        await db.commit()
+    run_after_commit(db)
+
+
 # Dependency for getting the session in your API endpoints
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        db.info["unit_of_work"] = settings.DB_UNIT_OF_WORK
+        try:
+            yield db
+            if defers_commit(db):
+                await commit_unit_of_work(db)
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Type
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+class PoolMetrics:
+    """Live statistics for one engine's connection pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine: Optional[AsyncEngine] = None
+        self._lock = threading.Lock()
+        self._connected_at: Dict[int, float] = {}
+        self._checked_out_at: Dict[int, float] = {}
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.checkouts = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def pool_class(self) -> Type[AsyncAdaptedQueuePool]:
+        """Queue pool that times how long callers block waiting for a connection."""
+        metrics = self
+
+        class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+            def _do_get(self):
+                start = time.perf_counter()
+                timed_out = False
+                try:
+                    return super()._do_get()
+                except PoolTimeoutError:
+                    timed_out = True
+                    raise
+                finally:
+                    metrics.record_wait(time.perf_counter() - start, timed_out)
+
+        return InstrumentedAsyncQueuePool
+
+    def attach(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        target = engine.sync_engine
+
+        @event.listens_for(target, "connect")
+        def _on_connect(dbapi_conn, record):
+            with self._lock:
+                self._connected_at[id(record)] = time.monotonic()
+
+        @event.listens_for(target, "checkout")
+        def _on_checkout(dbapi_conn, record, proxy):
+            with self._lock:
+                self.checkouts += 1
+                self._checked_out_at[id(record)] = time.monotonic()
+
+        @event.listens_for(target, "checkin")
+        def _on_checkin(dbapi_conn, record):
+            with self._lock:
+                self._checked_out_at.pop(id(record), None)
+
+        @event.listens_for(target, "close")
+        def _on_close(dbapi_conn, record):
+            with self._lock:
+                self._connected_at.pop(id(record), None)
+                self._checked_out_at.pop(id(record), None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        # Read through the engine: dispose() swaps in a fresh pool object.
+        pool: Optional[Pool] = self.engine.sync_engine.pool if self.engine else None
+        with self._lock:
+            ages = [now - t for t in self._connected_at.values()]
+            held = [now - t for t in self._checked_out_at.values()]
+            waits, wait_total = self.waits, self.wait_total
+            stats: Dict[str, Any] = {
+                "pool_class": type(pool).__name__ if pool is not None else None,
+                "checkouts_total": self.checkouts,
+                "wait": {
+                    "count": waits,
+                    "avg_ms": round(wait_total / waits * 1000, 3) if waits else 0.0,
+                    "max_ms": round(self.wait_max * 1000, 3),
+                    "timeouts": self.timeouts,
+                },
+                "connection_age_s": {
+                    "open": len(ages),
+                    "oldest": round(max(ages), 3) if ages else 0.0,
+                    "avg": round(sum(ages) / len(ages), 3) if ages else 0.0,
+                },
+                "longest_checkout_s": round(max(held), 3) if held else 0.0,
+            }
+        # QueuePool exposes its counters; Static/NullPool (SQLite) do not.
+        for key in ("size", "checkedout", "overflow", "checkedin"):
+            getter = getattr(pool, key, None)
+            stats[key] = getter() if callable(getter) else None
+        return stats
+
+
+registry: Dict[str, PoolMetrics] = {}
+
+
+def pool_statistics() -> Dict[str, Dict[str, Any]]:
+    return {name: metrics.snapshot() for name, metrics in registry.items()}
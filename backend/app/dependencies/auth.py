@@ -1,45 +1,224 @@
+import secrets
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from clients.supabase_client import SupabaseClient
+from core.config import settings
 from logger import get_logger
 
 logger = get_logger("auth")
 security = HTTPBearer()
 supabase = SupabaseClient().client
 
+_HMAC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+_ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "PS256"}
+
+WS_TICKET_AUDIENCE = "chat-ws"
+
+
+class SigningKeyUnavailable(Exception):
+    """Raised when no local key can verify a token (e.g. secret or JWKS missing)."""
+
+
+@lru_cache()
+def _jwks_client() -> jwt.PyJWKClient:
+    url = settings.SUPABASE_JWKS_URL or (
+        f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    )
+    # SigningKeys below owns caching and decides when the endpoint is hit
+    return jwt.PyJWKClient(url, cache_jwk_set=False, cache_keys=False)
+
+
+class SigningKeys:
+    """
+    The JWKS signing keys by key id, cached in-process.
+
+    The endpoint is fetched when the keys are older than JWKS_CACHE_SECONDS
+    or a token names an unknown `kid` (key rotation), but never more often
+    than every JWKS_MIN_REFRESH_SECONDS, failed fetches included. Once keys
+    are known, a token with any other `kid` is simply invalid: forged key
+    ids cost neither a JWKS fetch nor a call to Supabase.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at: Optional[float] = None
+        self._attempted_at: Optional[float] = None
+        self._error: Optional[Exception] = None
+
+    def get(self, kid: Optional[str]) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            stale = (
+                self._fetched_at is None
+                or now - self._fetched_at >= settings.JWKS_CACHE_SECONDS
+            )
+            may_fetch = (
+                self._attempted_at is None
+                or now - self._attempted_at >= settings.JWKS_MIN_REFRESH_SECONDS
+            )
+            if (stale or kid not in self._keys) and may_fetch:
+                self._attempted_at = now
+                self._fetch(now)
+            if not self._keys:
+                raise SigningKeyUnavailable(f"JWKS unavailable: {self._error}")
+            if kid not in self._keys:
+                raise jwt.InvalidTokenError(f'No signing key matches "{kid}"')
+            return self._keys[kid]
+
+    def _fetch(self, now: float) -> None:
+        try:
+            keys = _jwks_client().get_signing_keys()
+        except jwt.PyJWKClientError as e:
+            # keep serving the keys we have; a rotation is retried later
+            self._error = e
+            logger.warning(f"Could not fetch JWKS: {e}")
+            return
+        self._keys = {key.key_id: key.key for key in keys}
+        self._fetched_at = now
+        self._error = None
+
+
+signing_keys = SigningKeys()
+
+
+def _signing_key(token: str, algorithm: Optional[str]) -> Any:
+    if algorithm in _HMAC_ALGORITHMS:
+        if not settings.SUPABASE_JWT_SECRET:
+            raise SigningKeyUnavailable("SUPABASE_JWT_SECRET is not configured")
+        return settings.SUPABASE_JWT_SECRET
+    if algorithm in _ASYMMETRIC_ALGORITHMS:
+        return signing_keys.get(jwt.get_unverified_header(token).get("kid"))
+    raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm {algorithm}")
+
+
+def _claims_to_user(claims: Dict[str, Any]) -> Dict[str, Any]:
+    role = (claims.get("user_metadata") or {}).get("role")
+    if not role:
+        raise HTTPException(status_code=403, detail="Role not assigned to the user")
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": role,
+    }
+
+
+def verify_jwt_locally(token: str) -> Dict[str, Any]:
+    """
+    Verify signature, expiry and audience without a round trip to Supabase.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    key = _signing_key(token, algorithm)
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.JWT_AUDIENCE,
+        leeway=settings.JWT_LEEWAY_SECONDS,
+        options={"require": ["exp", "sub"]},
+    )
+    return _claims_to_user(claims)
+
+
+def verify_jwt_remotely(token: str) -> Dict[str, Any]:
+    """
+    Retrieve the user from Supabase, which also validates the token.
+    """
+    response = supabase.auth.get_user(token)
+    user = response.user
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Extract role from user's metadata
+    resp = user.model_dump()  # Assuming user is a Pydantic model
+    role = resp.get("user_metadata", {}).get("role")
+    if not role:
+        raise HTTPException(status_code=403, detail="Role not assigned to the user")
+
+    return {
+        "id": resp["id"],
+        "email": resp["email"],
+        "role": role,
+    }
+
 
 def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Verify the JWT token and retrieve the user information.
     """
-    logger.info(f"the credentials {credentials}")
     token = credentials.credentials
     try:
-        # Retrieve the user from Supabase
-        response = supabase.auth.get_user(token)
-        user = response.user
-
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Extract role from user's metadata
-        resp = user.model_dump()  # Assuming user is a Pydantic model
-        logger.info(f"the user info {resp}, {type(resp)}")
-        role = resp.get("user_metadata", {}).get("role")
-        if not role:
-            raise HTTPException(status_code=403, detail="Role not assigned to the user")
-
-        return {
-            "id": resp["id"],
-            "email": resp["email"],
-            "role": role,
-        }
+        if settings.JWT_VERIFY_LOCALLY:
+            try:
+                return verify_jwt_locally(token)
+            except SigningKeyUnavailable as e:
+                if not settings.JWT_REMOTE_FALLBACK:
+                    raise
+                logger.warning(f"Local JWT verification unavailable ({e}), using Supabase")
+        return verify_jwt_remotely(token)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=401, detail=f"Token verification failed: {str(e)}"
         ) from e
 
 
+@lru_cache()
+def _ws_ticket_secret() -> str:
+    if settings.WS_TICKET_SECRET:
+        return settings.WS_TICKET_SECRET
+    logger.warning("WS_TICKET_SECRET is not set; tickets only verify on the worker that issued them")
+    return secrets.token_urlsafe(32)
+
+
+def issue_ws_ticket(user: Dict[str, Any], chat_id: str) -> Tuple[str, int]:
+    """
+    Signed, short-lived ticket for one user on one chat. Membership was
+    checked when it was issued, so the handshake needs neither Supabase
+    nor the database while it is valid.
+    """
+    ttl = settings.WS_TICKET_TTL_SECONDS
+    now = int(time.time())
+    claims = {
+        "sub": user["id"],
+        "email": user.get("email"),
+        "role": user["role"],
+        "chat": chat_id,
+        "aud": WS_TICKET_AUDIENCE,
+        "iat": now,
+        "exp": now + ttl,
+    }
+    return jwt.encode(claims, _ws_ticket_secret(), algorithm="HS256"), ttl
+
+
+def verify_ws_ticket(ticket: str) -> Dict[str, Any]:
+    try:
+        claims = jwt.decode(
+            ticket,
+            _ws_ticket_secret(),
+            algorithms=["HS256"],
+            audience=WS_TICKET_AUDIENCE,
+            leeway=settings.JWT_LEEWAY_SECONDS,
+            options={"require": ["exp", "sub", "chat"]},
+        )
+    except jwt.PyJWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid ticket: {e}") from e
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims["role"],
+        "chat_id": claims["chat"],
+    }
+
+
 def role_required(*allowed_roles: str):
     def wrapper(user=Depends(verify_jwt)):
         if user["role"] not in allowed_roles and user["role"] != "superadmin":
@@ -1,15 +1,23 @@
 from fastapi import Depends, HTTPException, WebSocket
 from fastapi.security import HTTPAuthorizationCredentials
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
-from .auth import verify_jwt
+from .auth import verify_jwt, verify_ws_ticket
 
-DBSessionDep = Annotated[Session, Depends(get_db)]
+DBSessionDep = Annotated[AsyncSession, Depends(get_db)]
 
 CurrentUser = Annotated[dict, Depends(verify_jwt)]
 
 async def get_current_user_ws(websocket: WebSocket):
+    ticket = websocket.query_params.get("ticket")
+    if ticket:
+        try:
+            # carries "chat_id": the chat membership was checked at issuance
+            return verify_ws_ticket(ticket)
+        except HTTPException:
+            await websocket.close(code=4401)
+            return
     token = websocket.query_params.get("token") or websocket.headers.get("Authorization", "").replace("Bearer ", "")
     if not token:
         await websocket.close(code=4401)
@@ -12,7 +12,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from core.config import settings
-from database import Base, engine
+from database import Base, engine, replica_engine
+from sockets import build_backplane, manager
+from services.message_service import message_writer
+from services.scan_service import scan_workers
 from api.endpoints import api_router
 from clients.supabase_client import SupabaseClient
 from logger import get_logger
@@ -33,7 +36,16 @@ async def lifespan(app):
     """
     # --- Startup logic ---
     # Create tables (if not exist)
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Cross-worker chat fan-out
+    await manager.start(build_backplane())
+    if message_writer is not None:
+        await message_writer.start()
+    if settings.SCAN_JOB_MODE:
+        # also resumes jobs left queued or running by the previous process
+        await scan_workers.start()
 
     # e.g. ensure a superadmin exists
     # SupabaseClient().ensure_superadmin()
@@ -45,7 +57,15 @@ async def lifespan(app):
         logger.info("Checking active threads during shutdown...")
         for thread in threading.enumerate():
             logger.info(f"Thread still running: {thread.name}")
-        engine.dispose()
+        # stop taking jobs before the manager that pushes their results goes away
+        await scan_workers.stop()
+        await manager.stop()
+        if message_writer is not None:
+            # Persist every chat message that was already broadcast
+            await message_writer.stop()
+        await engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
 
         logger.info("Shutdown complete.")
 
@@ -74,6 +94,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
     
 # ------------------------------------------------------------------
@@ -91,4 +112,12 @@ client.sign_in(email=settings.SUPERADMIN_EMAIL, password=settings.SUPERADMIN_PAS
 # ------------------------------------------------------------------
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="localhost", port=9213, timeout_graceful_shutdown=5)
+    uvicorn.run(
+        app,
+        host="localhost",
+        port=9213,
+        timeout_graceful_shutdown=5,
+        # protocol-level keepalive for chat sockets; clients answer automatically
+        ws_ping_interval=settings.WS_PROTOCOL_PING_INTERVAL_SECONDS,
+        ws_ping_timeout=settings.WS_PROTOCOL_PING_TIMEOUT_SECONDS,
+    )
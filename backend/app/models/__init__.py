@@ -1,4 +1,4 @@
 from .chat import Chat
 from .message import Message
-from .scan import ScanResult
+from .scan import ScanBlob, ScanJob, ScanPrediction, ScanResult
 from .users import User
\ No newline at end of file
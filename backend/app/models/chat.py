@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, DateTime, func, Text
+from sqlalchemy import Column, ForeignKey, DateTime, Index, func, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -8,16 +8,32 @@ from database import Base
 
 class Chat(Base):
     __tablename__ = "chat"
+    __table_args__ = (
+        Index("ix_chat_customer_created_id", "customer_id", "created_at", "id"),
+        Index("ix_chat_merchant_created_id", "merchant_id", "created_at", "id"),
+        # Serve the inbox: one side's chats by latest activity
+        Index("ix_chat_customer_last_message", "customer_id", "last_message_at", "id"),
+        Index("ix_chat_merchant_last_message", "merchant_id", "last_message_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     merchant_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Denormalized by ConversationCRUD.record_messages on every message insert.
+    # Until the first message, last_message_at is the chat's creation time.
+    last_message_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+    last_message_id = Column(UUID(as_uuid=True), nullable=True)
+    # Per-participant read cursors: messages after these count as unread
+    customer_last_read_at = Column(DateTime, nullable=True)
+    merchant_last_read_at = Column(DateTime, nullable=True)
+
     customer = relationship("User", back_populates="conversations_as_customer", foreign_keys=[customer_id])
     merchant = relationship("User", back_populates="conversations_as_merchant", foreign_keys=[merchant_id])
     messages = relationship(
     "Message",
     back_populates="conversation",    # ← was "chat"
-    cascade="all, delete"
+    cascade="all, delete",
+    passive_deletes=True,             # rows go via ON DELETE CASCADE
 )
@@ -1,20 +1,79 @@
-from sqlalchemy import Column, ForeignKey, Text, DateTime, String, func
+from sqlalchemy import DDL, Column, ForeignKey, Text, DateTime, String, Index, event, func, literal_column
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import inspect
 from sqlalchemy.orm import relationship
+from core.text import normalize_search_text
 from database import Base
 import uuid
 from datetime import datetime
 
 
+def _search_text(context):
+    return normalize_search_text(context.get_current_parameters().get("content"))
+
+
+def with_search_text(values):
+    """
+    Add the matching search_text to UPDATE values that change content.
+    There is no onupdate: it would see no content in other updates and
+    blank the column.
+    """
+    if "content" not in values:
+        return values
+    return {**values, "search_text": normalize_search_text(values["content"])}
+
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves history pages: WHERE chat_id = ? ORDER BY created_at, id
+        Index("ix_messages_chat_created_id", "chat_id", "created_at", "id"),
+        # Full-text search (Postgres); SQLite gets the messages_fts table below
+        Index(
+            "ix_messages_search_text",
+            func.to_tsvector(literal_column("'simple'"), literal_column("search_text")),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    chat_id = Column(UUID(as_uuid=True), ForeignKey("chat.id"), nullable=False)
+    chat_id = Column(UUID(as_uuid=True), ForeignKey("chat.id", ondelete="CASCADE"), nullable=False)
     sender_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     content = Column(Text, nullable=True)              # نص
     image_url = Column(String, nullable=True)          # رابط الصورة المرفقـة (اختياري)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # normalize_search_text(content): set on insert; updates go through with_search_text
+    search_text = Column(Text, nullable=True, default=_search_text)
 
     conversation = relationship("Chat", back_populates="messages")
     sender = relationship("User", back_populates="messages_sent")
+
+
+# SQLite (local/tests): external-content FTS5 index kept in sync by triggers
+_SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "search_text, content='messages', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, search_text) "
+    "VALUES ('delete', old.rowid, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF search_text ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, search_text) "
+    "VALUES ('delete', old.rowid, old.search_text); "
+    "INSERT INTO messages_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+]
+for _statement in _SQLITE_FTS:
+    event.listen(Message.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(
+    Message.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"),
+)
+
+
+@event.listens_for(Message, "before_update")
+def _refresh_search_text(mapper, connection, target):
+    # ORM flushes that change content (msg.content = ...)
+    if inspect(target).attrs.content.history.has_changes():
+        target.search_text = normalize_search_text(target.content)
@@ -1,17 +1,59 @@
-from sqlalchemy import Column, UUID, String, Text, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, UUID, Integer, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 from database import Base
 
 
+class ScanBlob(Base):
+    """One stored image file, shared by every scan of identical bytes."""
+    __tablename__ = "scan_blobs"
+
+    digest = Column(String(64), primary_key=True)  # hex SHA-256 of the content
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ScanPrediction(Base):
+    """Persistent tier of the prediction cache: one model output per image and model version."""
+    __tablename__ = "scan_predictions"
+
+    digest = Column(String(64), primary_key=True)  # hex SHA-256 of the image
+    model_version = Column(String(64), primary_key=True)
+    prediction = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class ScanResult(Base):
     __tablename__ = "scan_results"
+    __table_args__ = (Index("ix_scan_results_user_created_id", "user_id", "created_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     image_url = Column(String, nullable=False)
+    blob_digest = Column(String(64), ForeignKey("scan_blobs.digest"), nullable=True, index=True)
     prediction = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    user = relationship("User", back_populates="scans")
\ No newline at end of file
+    user = relationship("User", back_populates="scans")
+
+class ScanJob(Base):
+    """A pending or finished scan. The table is the queue, so jobs survive restarts."""
+    __tablename__ = "scan_jobs"
+    __table_args__ = (Index("ix_scan_jobs_status_available", "status", "available_at"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    # cleared once the job's blob reference passes to its scan or is released
+    blob_digest = Column(String(64), ForeignKey("scan_blobs.digest", ondelete="SET NULL"))
+    image_url = Column(String, nullable=False)
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    scan_id = Column(UUID(as_uuid=True), ForeignKey("scan_results.id", ondelete="SET NULL"))
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
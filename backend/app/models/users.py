@@ -1,5 +1,6 @@
 import enum, uuid
-from sqlalchemy import Column, String, DateTime, Enum
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Enum, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -14,11 +15,13 @@ class UserRole(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, index=True, nullable=False)
     name = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.customer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
     # علاقات
     conversations_as_customer = relationship("Chat", back_populates="customer", foreign_keys="Chat.customer_id")
@@ -1,3 +1,5 @@
 from .chat import *
 from .users import *
-from .scan import *
\ No newline at end of file
+from .scan import *
+from .pagination import *
+from .bulk import *
@@ -0,0 +1,11 @@
+from typing import List
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class BulkResult(BaseModel):
+    requested: int
+    succeeded: int
+    ids: List[UUID] = []
+    failed_ids: List[UUID] = []
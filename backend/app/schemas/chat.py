@@ -1,6 +1,7 @@
+from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class MessageBase(BaseModel):
     content: str | None = None
@@ -14,8 +15,55 @@ class MessageOut(MessageBase):
     sender_id: UUID
     created_at: datetime
 
-    class ConfigDict:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageHistoryPage(BaseModel):
+    """Newest-first page of messages; pass a cursor back as ?before= or ?after=."""
+    items: List[MessageOut]
+    before_cursor: Optional[str] = None   # older messages exist
+    after_cursor: Optional[str] = None    # poll for newer messages
+
+class MessageSearchHit(BaseModel):
+    """
+    A message matching a search. `snippet` is HTML: the message text,
+    escaped, with matched words wrapped in <b></b>.
+    """
+    id: UUID
+    chat_id: UUID
+    sender_id: UUID
+    created_at: datetime
+    snippet: Optional[str] = None
+    rank: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+class InboxEntry(BaseModel):
+    """One conversation as shown in the inbox, from the caller's point of view."""
+    chat_id: UUID
+    counterparty_id: UUID
+    counterparty_name: Optional[str] = None
+    last_message_at: datetime
+    last_message_id: Optional[UUID] = None
+    last_message_sender_id: Optional[UUID] = None
+    last_message_preview: Optional[str] = None
+    last_message_image_url: Optional[str] = None
+    unread_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+class WSTicketOut(BaseModel):
+    """Pass as ?ticket= when connecting to /chat/ws/{chat_id}."""
+    ticket: str
+    expires_in: int
+
+class MessageReplay(BaseModel):
+    """
+    Messages missed since a resume point, oldest first. When `complete` is
+    false there are more: page on with ?after=after_cursor.
+    """
+    items: List[MessageOut]
+    complete: bool = True
+    after_cursor: Optional[str] = None
 
 class ChatCreate(BaseModel):
     merchant_id: UUID
@@ -26,5 +74,4 @@ class ChatOut(BaseModel):
     customer_id: UUID
     created_at: datetime
 
-    class ConfigDict:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -1,12 +1,23 @@
 from uuid import UUID
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class ScanResultOut(BaseModel):
     id: UUID
     image_url: str
-    prediction: str
+    prediction: str | None = None
     created_at: datetime
 
-    class ConfigDict:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ScanJobOut(BaseModel):
+    id: UUID
+    status: str
+    attempts: int
+    error: str | None = None
+    scan_id: UUID | None = None
+    created_at: datetime
+    updated_at: datetime
+    result: ScanResultOut | None = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
 from uuid import UUID
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -10,9 +10,11 @@ class UserBase(BaseModel):
 class UserUpdate(BaseModel):
     name: str | None = Field(default=None, min_length=2, max_length=60)
 
+class UserBulkUpdate(UserUpdate):
+    id: UUID
+
 class UserOut(UserBase):
     id: UUID
     created_at: datetime
 
-    class ConfigDict:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -1,18 +1,22 @@
 # app/services/chat_service.py
 from functools import lru_cache
-from typing import List
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 
-from crud.base_crud import BaseCRUD
+from crud.cache import entity_cache, membership_cache
+from crud.chat import ConversationCRUD
+from crud.pagination import InvalidCursorError
+from database import defers_commit, on_commit
 from dependencies import DBSessionDep
 from models.chat import Chat as ChatModel
+from schemas.chat import ChatOut, InboxEntry
 
 
 class ChatService:
-    def __init__(self, chat_crud: BaseCRUD[ChatModel]):
+    def __init__(self, chat_crud: ConversationCRUD):
         self.chat_crud = chat_crud
 
     async def create_chat(self, customer_id: UUID, merchant_id: UUID) -> ChatModel:
@@ -28,17 +32,80 @@ class ChatService:
             raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
         return chat
 
+    async def is_member(self, chat_id: UUID, user_id: UUID) -> bool:
+        """
+        Whether the user is one of the chat's two participants. Confirmed
+        memberships are cached, so reconnects skip the database.
+        """
+        key = (str(chat_id), str(user_id))
+        if membership_cache.get(key):
+            return True
+        participants = await self.chat_crud.get_participants(chat_id)
+        if participants is None:
+            raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+        if user_id not in participants:
+            return False
+        membership_cache.set(key, True)
+        return True
+
+    def _forget_members(self, chat: ChatModel) -> None:
+        keys = [(str(chat.id), str(uid)) for uid in (chat.customer_id, chat.merchant_id)]
+        for key in keys:
+            membership_cache.invalidate(key)
+        if defers_commit(self.chat_crud.db_session):
+            # A check racing the pending delete may have re-cached it
+            on_commit(
+                self.chat_crud.db_session,
+                lambda: [membership_cache.invalidate(k) for k in keys],
+            )
+
     async def get_chats_for_customer(self, customer_id: UUID) -> List[ChatModel]:
         return await self.chat_crud.get_all_by_field("customer_id", customer_id)
 
     async def get_chats_for_merchant(self, merchant_id: UUID) -> List[ChatModel]:
         return await self.chat_crud.get_all_by_field("merchant_id", merchant_id)
 
+    async def get_chats_page_for_user(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[ChatOut], Optional[str]]:
+        """Chats the user takes part in (either side), newest first."""
+        try:
+            return await self.chat_crud.get_page(
+                limit=limit,
+                cursor=cursor,
+                descending=True,
+                criteria=[
+                    (ChatModel.customer_id == user_id) | (ChatModel.merchant_id == user_id)
+                ],
+                schema=ChatOut,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def get_inbox(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[InboxEntry], Optional[str]]:
+        try:
+            return await self.chat_crud.list_inbox(user_id, limit=limit, cursor=cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except SQLAlchemyError:
+            raise HTTPException(status_code=500, detail="Failed to load inbox")
+
+    async def mark_read(self, chat_id: UUID, user_id: UUID) -> None:
+        if not await self.chat_crud.mark_read(chat_id, user_id):
+            raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+
     async def delete_chat(self, chat_id: UUID) -> None:
         chat = await self.get_chat_by_id(chat_id)
         await self.chat_crud.delete(chat.id)
+        self._forget_members(chat)
+
+
+def build_chat_service(db) -> ChatService:
+    return ChatService(ConversationCRUD(ChatModel, db, cache=entity_cache))
 
 
 @lru_cache()
 def get_chat_service(db: DBSessionDep) -> ChatService:
-    return ChatService(BaseCRUD(ChatModel, db))
+    return build_chat_service(db)
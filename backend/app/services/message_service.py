@@ -1,19 +1,68 @@
 # app/services/message_service.py
+from datetime import datetime
 from functools import lru_cache
-from typing import List, Dict, Any
-from uuid import UUID
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID, uuid4
 
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
-from crud.base_crud import BaseCRUD
+from crud.chat import ConversationCRUD, MessageCRUD
+from core.config import settings
+from crud.cache import entity_cache
+from crud.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from crud.write_behind import WriteBehindBuffer, WriteBehindFull
 from dependencies import DBSessionDep
+from models.chat import Chat as ChatModel
 from models.message import Message as MessageModel
+from sockets import ConnectionManager, manager
+from schemas.chat import MessageHistoryPage, MessageOut, MessageReplay, MessageSearchHit
+
+HISTORY_KEYS = ("created_at", "id")
+
+
+async def _record_batch(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    await ConversationCRUD(ChatModel, db).record_messages(rows, commit=False)
+
+# Chat messages accepted but not yet inserted (write-behind mode only)
+message_writer: Optional[WriteBehindBuffer] = (
+    WriteBehindBuffer(
+        "messages",
+        MessageModel,
+        batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+        interval=settings.CHAT_WRITE_BEHIND_INTERVAL_MS / 1000,
+        max_pending=settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+        after_insert=_record_batch,
+    )
+    if settings.CHAT_WRITE_BEHIND
+    else None
+)
+
+
+def history_cursor(msg: Any) -> str:
+    return encode_cursor(HISTORY_KEYS, [getattr(msg, k) for k in HISTORY_KEYS])
+
+
+def message_row(msg: Any) -> Dict[str, Any]:
+    return {key: getattr(msg, key) for key in ("id", "chat_id", "sender_id", "created_at")}
+
+
+def message_frame(msg: Any) -> Dict[str, Any]:
+    # Plain Python values; the frame is JSON-encoded once at broadcast time
+    return {"type": "message", **MessageOut.model_validate(msg).model_dump()}
 
 
 class MessageService:
-    def __init__(self, msg_crud: BaseCRUD[MessageModel]):
+    def __init__(
+        self,
+        msg_crud: MessageCRUD,
+        chat_crud: ConversationCRUD,
+        publisher: Optional[ConnectionManager] = None,
+    ):
         self.msg_crud = msg_crud
+        self.chat_crud = chat_crud
+        self.publisher = publisher
 
     async def send_message(self, data: Dict[str, Any]) -> MessageModel:
         """
@@ -22,24 +71,190 @@ class MessageService:
          - sender_id
          - content or image_url
         """
+        data = dict(data)
+        if "conversation_id" in data:
+            data["chat_id"] = data.pop("conversation_id")
+        if message_writer is not None:
+            return await self._send_write_behind(data)
         try:
-            return await self.msg_crud.create(data)
+            # Messages are broadcast right away, so they never wait for the
+            # end-of-request unit of work (a WebSocket request can last hours).
+            msg = await self.msg_crud.create(data, commit=False)
+            if msg is None:
+                raise HTTPException(status_code=500, detail="Failed to send message")
+            # Same transaction: the chat's inbox columns move with the insert
+            await self.chat_crud.record_messages([message_row(msg)], commit=True)
         except SQLAlchemyError:
             raise HTTPException(status_code=500, detail="Failed to send message")
+        if self.publisher is not None:
+            # Published once; each worker fans it out to its own sockets
+            await self.publisher.publish(str(msg.chat_id), message_frame(msg))
+        return msg
+
+    async def _send_write_behind(self, data: Dict[str, Any]) -> MessageModel:
+        """Broadcast first; the row is inserted with the next batch."""
+        row = {"id": uuid4(), "created_at": datetime.utcnow(), **data}
+        msg = MessageModel(**row)
+        try:
+            await message_writer.submit(row)
+        except WriteBehindFull:
+            raise HTTPException(status_code=503, detail="Chat is busy, try again shortly")
+        if self.publisher is not None:
+            await self.publisher.publish(str(msg.chat_id), message_frame(msg))
+        return msg
+
+    async def _read_your_writes(self) -> None:
+        # History must include messages still sitting in the write-behind buffer
+        if message_writer is not None and message_writer.pending:
+            await message_writer.flush()
 
     async def get_message_by_id(self, msg_id: UUID) -> MessageModel:
+        await self._read_your_writes()
         msg = await self.msg_crud.get_by_id(msg_id)
         if not msg:
             raise HTTPException(status_code=404, detail=f"Message {msg_id} not found")
         return msg
 
-    async def get_messages_for_chat(self, conversation_id: UUID) -> List[MessageModel]:
-        return await self.msg_crud.get_all_by_field("conversation_id", conversation_id)
+    async def get_messages_for_chat(self, conversation_id: UUID) -> List[MessageOut]:
+        await self._read_your_writes()
+        return await self.msg_crud.get_all_by_field(
+            "chat_id", conversation_id, schema=MessageOut
+        )
+
+    async def get_messages_page(
+        self,
+        conversation_id: UUID,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> MessageHistoryPage:
+        """
+        One newest-first page of a conversation's history, served from the
+        (chat_id, created_at, id) index. `before` walks back into older
+        messages; `after` fetches what arrived since a previous page.
+        """
+        if before and after:
+            raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+        await self._read_your_writes()
+        try:
+            if after:
+                items, _ = await self.msg_crud.get_page(
+                    limit=limit,
+                    cursor=after,
+                    order_by=HISTORY_KEYS,
+                    filters={"chat_id": conversation_id},
+                    schema=MessageOut,
+                )
+                items.reverse()
+                return MessageHistoryPage(
+                    items=items,
+                    before_cursor=history_cursor(items[-1]) if items else None,
+                    after_cursor=history_cursor(items[0]) if items else after,
+                )
+            items, older = await self.msg_crud.get_page(
+                limit=limit,
+                cursor=before,
+                order_by=HISTORY_KEYS,
+                descending=True,
+                filters={"chat_id": conversation_id},
+                schema=MessageOut,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return MessageHistoryPage(
+            items=items,
+            before_cursor=older,
+            after_cursor=history_cursor(items[0]) if items else None,
+        )
+
+    async def get_messages_since(
+        self,
+        conversation_id: UUID,
+        last_seen_id: Optional[UUID] = None,
+        cursor: Optional[str] = None,
+        limit: int = 200,
+    ) -> MessageReplay:
+        """
+        What a reconnecting client missed after `last_seen_id` (or a history
+        cursor), oldest first. Served from the room's replay buffer when it
+        covers the gap, otherwise from the (chat_id, created_at, id) index.
+        """
+        room = str(conversation_id)
+        replay = self.publisher.replay if self.publisher is not None else None
+        frames = None
+        if last_seen_id is not None:
+            if replay is not None:
+                frames = replay.since_id(room, str(last_seen_id))
+            if frames is None:
+                # the message may have been broadcast but not yet flushed
+                await self._read_your_writes()
+                seen = await self.msg_crud.get_by_id(last_seen_id)
+                if seen is None or seen.chat_id != conversation_id:
+                    raise HTTPException(status_code=400, detail="Unknown last_seen_id")
+                cursor = history_cursor(seen)
+        elif cursor is None:
+            raise HTTPException(status_code=400, detail="Pass last_seen_id or cursor")
+
+        if frames is None:
+            try:
+                created_at, msg_id = decode_cursor(
+                    cursor, HISTORY_KEYS, [MessageModel.created_at, MessageModel.id]
+                )
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if replay is not None:
+                frames = replay.since(room, (created_at, str(msg_id)))
+
+        if frames is not None:
+            items = [MessageOut.model_validate(f) for f in frames[:limit]]
+            complete = len(frames) <= limit
+        else:
+            await self._read_your_writes()
+            items, more = await self.msg_crud.get_page(
+                limit=limit,
+                cursor=cursor,
+                order_by=HISTORY_KEYS,
+                filters={"chat_id": conversation_id},
+                schema=MessageOut,
+            )
+            complete = more is None
+        return MessageReplay(
+            items=items,
+            complete=complete,
+            after_cursor=history_cursor(items[-1]) if items else cursor,
+        )
+
+    async def search_messages(
+        self,
+        user_id: UUID,
+        query: str,
+        chat_id: Optional[UUID] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[MessageSearchHit], Optional[str]]:
+        await self._read_your_writes()
+        try:
+            return await self.msg_crud.search(
+                user_id, query, chat_id=chat_id, limit=limit, cursor=cursor
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except SQLAlchemyError:
+            raise HTTPException(status_code=500, detail="Search failed")
 
     async def delete_message(self, msg_id: UUID) -> None:
+        await self._read_your_writes()
         await self.msg_crud.delete(msg_id)
 
 
+def build_message_service(db) -> MessageService:
+    return MessageService(
+        MessageCRUD(MessageModel, db),
+        ConversationCRUD(ChatModel, db, cache=entity_cache),
+        publisher=manager,
+    )
+
+
 @lru_cache()
 def get_message_service(db: DBSessionDep) -> MessageService:
-    return MessageService(BaseCRUD(MessageModel, db))
+    return build_message_service(db)
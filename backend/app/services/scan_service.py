@@ -1,31 +1,265 @@
 # app/services/scan_result_service.py
+import asyncio
+import threading
+from datetime import datetime, timedelta
 from functools import lru_cache
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
 from uuid import UUID
 
 from sqlalchemy.exc import SQLAlchemyError
-from fastapi import HTTPException
+from fastapi import HTTPException, UploadFile
+
+from core.config import settings
 
 from crud.base_crud import BaseCRUD
+from crud.cache import entity_cache, prediction_cache
+from crud.pagination import InvalidCursorError
+from crud.scan import BlobCRUD, PredictionCRUD, ScanJobCRUD, collect_blob
+from database import AsyncSessionLocal, defers_commit, on_commit
 from dependencies import DBSessionDep
-from models.scan import ScanResult as ScanResultModel
+from logger import get_logger
+from models.scan import (
+    ScanBlob as ScanBlobModel,
+    ScanJob as ScanJobModel,
+    ScanPrediction as ScanPredictionModel,
+    ScanResult as ScanResultModel,
+)
 from models.users import User as UserModel
+from sockets import manager
+from schemas.scan import ScanJobOut, ScanResultOut
+from services.worker_pool import WorkerPool
+from storage.blobs import blob_store
+from storage.uploads import StoredUpload, UnsupportedMediaType, UploadTooLarge, save_upload
+
+logger = get_logger(__name__)
+
+PredictionKey = Tuple[str, str]  # (image sha256, model version)
+
+
+async def perform_scan_prediction(image_path: str) -> Optional[str]:
+    """Run the scan model on a stored image. No model is wired in yet."""
+    return None
+
+
+_collectors: Set[asyncio.Task] = set()
+
+
+def schedule_blob_collection(digest: str, path: str) -> None:
+    """Collect in the background, e.g. from an on_commit callback."""
+    task = asyncio.get_running_loop().create_task(collect_blob(digest, path))
+    _collectors.add(task)
+    task.add_done_callback(_collectors.discard)
+
+
+class _PredictionStats:
+    """Where predictions came from, across both cache tiers."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def record(self, source: str) -> None:
+        with self._lock:
+            setattr(self, source, getattr(self, source) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "model_version": settings.SCAN_MODEL_VERSION,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+prediction_stats = _PredictionStats()
+
+# Inference in progress per key, so concurrent uploads of one image run the model once
+_inflight: Dict[PredictionKey, "asyncio.Future[Optional[str]]"] = {}
+
+
+async def _remember_prediction(key: PredictionKey, prediction: str) -> None:
+    """
+    Best effort, in its own session: losing a cache row only costs a later
+    inference, while a failure inside the request's unit of work would roll
+    back the scan itself.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            await PredictionCRUD(ScanPredictionModel, db).remember(*key, prediction, commit=True)
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not store prediction for {key[0]}: {e}")
+
+
+def prediction_statistics() -> Dict[str, Any]:
+    return prediction_stats.stats()
+
+
+async def _predict_once(key: PredictionKey, image_path: str) -> Optional[str]:
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(perform_scan_prediction(image_path))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # A waiter that gives up must not cancel the run the others are awaiting
+    return await asyncio.shield(future)
 
 
 class ScanResultService:
-    def __init__(self, scan_crud: BaseCRUD[ScanResultModel], user_crud: BaseCRUD[UserModel]):
+    def __init__(
+        self,
+        scan_crud: BaseCRUD[ScanResultModel],
+        user_crud: BaseCRUD[UserModel],
+        blob_crud: BlobCRUD,
+        prediction_crud: PredictionCRUD,
+        job_crud: ScanJobCRUD,
+    ):
         self.scan_crud = scan_crud
         self.user_crud = user_crud
+        self.blob_crud = blob_crud
+        self.prediction_crud = prediction_crud
+        self.job_crud = job_crud
+
+    async def check_can_scan(self, user_id: UUID) -> None:
+        """Reject a scan up front, before its upload is copied to storage."""
+        user = await self.user_crud.get_by_id(user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if settings.SCAN_JOB_MODE:
+            await self._check_queue_depth()
+
+    async def _check_queue_depth(self) -> None:
+        if await self.job_crud.count_unfinished() >= settings.SCAN_JOB_QUEUE_DEPTH:
+            raise HTTPException(
+                status_code=503,
+                detail="Scan queue is full, try again later",
+                headers={"Retry-After": str(int(settings.SCAN_JOB_RETRY_BACKOFF_SECONDS) or 1)},
+            )
+
+    async def store_upload(self, file: UploadFile) -> StoredUpload:
+        try:
+            return await save_upload(
+                file,
+                blob_store.staging,
+                max_bytes=settings.SCAN_MAX_UPLOAD_BYTES,
+                chunk_size=settings.UPLOAD_CHUNK_SIZE,
+            )
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UnsupportedMediaType as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except OSError:
+            raise HTTPException(status_code=500, detail="Could not save uploaded file")
+
+    async def discard_upload(self, upload: StoredUpload) -> None:
+        """Drop an upload's staged copy if it is still there; never raises."""
+        try:
+            await blob_store.discard(upload)
+        except OSError as e:
+            logger.warning(f"Could not remove staged upload {upload.path}: {e}")
+
+    async def predict(self, digest: str, image_path: str) -> Optional[str]:
+        """
+        Prediction for a stored image: from memory, then the
+        scan_predictions table, and only then from the model.
+        """
+        key = (digest, settings.SCAN_MODEL_VERSION)
+        prediction = prediction_cache.get(key)
+        if prediction is not None:
+            prediction_stats.record("memory_hits")
+            return prediction
+        prediction = await self.prediction_crud.lookup(*key)
+        if prediction is not None:
+            prediction_stats.record("db_hits")
+            prediction_cache.set(key, prediction)
+            return prediction
+        prediction_stats.record("misses")
+        prediction = await _predict_once(key, image_path)
+        if prediction is not None:
+            prediction_cache.set(key, prediction)
+            await _remember_prediction(key, prediction)
+        return prediction
 
-    async def create_scan_result(self, data: Dict[str, Any]) -> ScanResultModel:
+    async def create_scan_result(
+        self, data: Dict[str, Any], upload: Optional[StoredUpload] = None
+    ) -> ScanResultModel:
         # ensure user exists
         user = await self.user_crud.get_by_id(data["user_id"])
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         try:
-            return await self.scan_crud.create(data)
+            if upload is not None:
+                path = await self._take_blob(upload)
+                data = {**data, "image_url": path, "blob_digest": upload.sha256}
+            scan = await self.scan_crud.create(data)
         except SQLAlchemyError:
             raise HTTPException(status_code=500, detail="Failed to create scan result")
+        if scan is None and upload is not None:
+            # the transaction rolls back: drop the file unless others use it
+            schedule_blob_collection(upload.sha256, path)
+        return scan
+
+    async def _take_blob(self, upload: StoredUpload) -> str:
+        """Store an upload by content and add a reference to it; returns the blob path."""
+        # identical images share one file; each scan or job holds a reference to it
+        path = blob_store.path_for_upload(upload)
+        await self.blob_crud.acquire(
+            upload.sha256, path, upload.size, upload.content_type, commit=False
+        )
+        try:
+            await blob_store.adopt(upload)
+        except OSError:
+            raise HTTPException(status_code=500, detail="Could not save uploaded file")
+        return path
+
+    async def _drop_blob(self, digest: str) -> None:
+        """Release a reference; the file goes once the last one is committed away."""
+        orphan = await self.blob_crud.release(digest)
+        if orphan is None:
+            return
+        session = self.blob_crud.db_session
+        if defers_commit(session):
+            on_commit(session, lambda: schedule_blob_collection(digest, orphan))
+        else:
+            await collect_blob(digest, orphan)
+
+    async def enqueue_scan(self, user_id: UUID, upload: StoredUpload) -> ScanJobModel:
+        """Persist a scan job for the worker pool; it is handed over on commit."""
+        user = await self.user_crud.get_by_id(user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await self._check_queue_depth()
+        try:
+            # the job holds the blob reference and passes it on to its scan result
+            path = await self._take_blob(upload)
+        except SQLAlchemyError:
+            raise HTTPException(status_code=500, detail="Failed to enqueue scan")
+        job = await self.job_crud.create(
+            {"user_id": user_id, "blob_digest": upload.sha256, "image_url": path}
+        )
+        if job is None:
+            schedule_blob_collection(upload.sha256, path)
+            raise HTTPException(status_code=500, detail="Failed to enqueue scan")
+        session = self.job_crud.db_session
+        if defers_commit(session):
+            on_commit(session, lambda: scan_workers.notify(job.id))
+        else:
+            scan_workers.notify(job.id)
+        return job
+
+    async def get_job(self, job_id: UUID, user_id: UUID) -> ScanJobOut:
+        job = await self.job_crud.get_by_id(job_id)
+        if not job or job.user_id != user_id:
+            raise HTTPException(status_code=404, detail=f"Scan job {job_id} not found")
+        out = ScanJobOut.model_validate(job)
+        if job.scan_id is not None:
+            scan = await self.scan_crud.get_by_id(job.scan_id)
+            out.result = ScanResultOut.model_validate(scan) if scan else None
+        return out
 
     async def get_scan_by_id(self, scan_id: UUID) -> ScanResultModel:
         scan = await self.scan_crud.get_by_id(scan_id)
@@ -37,15 +271,133 @@ class ScanResultService:
         # returns all scan_results for a given user
         return await self.scan_crud.get_all_by_field("user_id", user_id)
 
+    async def get_scans_page_for_user(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[ScanResultOut], Optional[str]]:
+        # newest scans first, keyset-paginated on (created_at, id)
+        try:
+            return await self.scan_crud.get_page(
+                limit=limit,
+                cursor=cursor,
+                descending=True,
+                filters={"user_id": user_id},
+                schema=ScanResultOut,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     async def delete_scan(self, scan_id: UUID) -> None:
         # raises if missing
         scan = await self.get_scan_by_id(scan_id)
-        await self.scan_crud.delete(scan.id)
+        if not scan.blob_digest:
+            await self.scan_crud.delete(scan.id)
+            return
+        try:
+            await self.scan_crud.delete(scan.id, commit=False)
+            await self._drop_blob(scan.blob_digest)
+        except SQLAlchemyError:
+            raise HTTPException(status_code=500, detail="Failed to delete scan result")
 
 
-@lru_cache()
-def get_scan_service(db: DBSessionDep) -> ScanResultService:
+def build_scan_service(db) -> ScanResultService:
     return ScanResultService(
         BaseCRUD(ScanResultModel, db),
-        BaseCRUD(UserModel, db),
+        BaseCRUD(UserModel, db, cache=entity_cache),
+        BlobCRUD(ScanBlobModel, db),
+        PredictionCRUD(ScanPredictionModel, db),
+        ScanJobCRUD(ScanJobModel, db),
     )
+
+
+@lru_cache()
+def get_scan_service(db: DBSessionDep) -> ScanResultService:
+    return build_scan_service(db)
+
+
+def scan_room(user_id: Any) -> str:
+    """Realtime room a user's scan job updates are pushed to."""
+    return f"scans:{user_id}"
+
+
+def _job_lease(now: datetime) -> datetime:
+    # a job running longer than this lost its worker (crash or restart)
+    return now - timedelta(seconds=2 * settings.SCAN_JOB_TIMEOUT_SECONDS)
+
+
+async def due_scan_jobs(limit: int) -> List[UUID]:
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        return await ScanJobCRUD(ScanJobModel, db).due(now, _job_lease(now), limit)
+
+
+async def run_scan_job(job_id: UUID) -> None:
+    """
+    Claim a job, predict, and record the scan result together with the
+    job's completion. Failures are retried with exponential backoff; the
+    last one marks the job failed and releases its image.
+    """
+    async with AsyncSessionLocal() as db:
+        service = build_scan_service(db)
+        now = datetime.utcnow()
+        job = await service.job_crud.claim(job_id, now, _job_lease(now))
+        if job is None:
+            return  # not due any more, or claimed by another worker
+        try:
+            prediction = await asyncio.wait_for(
+                service.predict(job.blob_digest, job.image_url),
+                timeout=settings.SCAN_JOB_TIMEOUT_SECONDS,
+            )
+            # the scan result takes over the job's blob reference
+            scan = await service.scan_crud.create(
+                {
+                    "user_id": job.user_id,
+                    "image_url": job.image_url,
+                    "blob_digest": job.blob_digest,
+                    "prediction": prediction,
+                },
+                commit=False,
+            )
+            if scan is None:
+                raise RuntimeError("Failed to create scan result")
+            done = await service.job_crud.update(
+                job.id, {"status": "done", "scan_id": scan.id, "blob_digest": None}
+            )
+            if done is None:
+                raise RuntimeError("Failed to complete scan job")
+        except Exception as e:
+            await db.rollback()
+            error = str(e) or type(e).__name__
+            if job.attempts < settings.SCAN_JOB_MAX_ATTEMPTS:
+                delay = settings.SCAN_JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+                logger.warning(f"Scan job {job.id} attempt {job.attempts} failed, retry in {delay}s: {error}")
+                retry_at = datetime.utcnow() + timedelta(seconds=delay)
+                await service.job_crud.update(
+                    job.id, {"status": "queued", "error": error, "available_at": retry_at}
+                )
+                return
+            logger.error(f"Scan job {job.id} failed after {job.attempts} attempts: {error}")
+            done = await service.job_crud.update(
+                job.id, {"status": "failed", "error": error, "blob_digest": None}, commit=False
+            )
+            if done is not None:
+                await service._drop_blob(job.blob_digest)
+            await db.commit()
+            scan = None
+        if done is None:
+            return
+        out = ScanJobOut.model_validate(done)
+        out.result = ScanResultOut.model_validate(scan) if scan is not None else None
+    try:
+        await manager.publish(scan_room(job.user_id), {"type": "scan_job", **out.model_dump(mode="json")})
+    except Exception as e:
+        logger.warning(f"Could not push scan job {job.id}: {e}")
+
+
+scan_workers = WorkerPool(
+    "scan_jobs",
+    handler=run_scan_job,
+    poll=due_scan_jobs,
+    concurrency=settings.SCAN_JOB_CONCURRENCY,
+    queue_size=settings.SCAN_JOB_QUEUE_DEPTH,
+    poll_interval=settings.SCAN_JOB_POLL_INTERVAL_SECONDS,
+)
@@ -1,14 +1,17 @@
 from functools import lru_cache
-from typing import List
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
 
 from crud.base_crud import BaseCRUD
+from crud.cache import entity_cache
+from crud.pagination import InvalidCursorError
 from dependencies import DBSessionDep
 from models.users import User as UserModel, UserRole
-from schemas.users import UserOut, UserUpdate, UserBase
+from schemas.bulk import BulkResult
+from schemas.users import UserBulkUpdate, UserOut, UserUpdate, UserBase
 
 
 class UserService:
@@ -34,8 +37,18 @@ class UserService:
 
     async def get_all_users(self, skip: int = 0, limit: int = 100) -> List[UserOut]:
         """List users with pagination."""
-        users = await self.user_crud.get_all(skip=skip, limit=limit)
-        return [u for u in users]
+        return await self.user_crud.get_all(skip=skip, limit=limit, schema=UserOut)
+
+    async def get_users_page(
+        self, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[List[UserOut], Optional[str]]:
+        """List users ordered by (created_at, id) using keyset pagination."""
+        try:
+            return await self.user_crud.get_page(
+                limit=limit, cursor=cursor, schema=UserOut
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     async def update_user(self, user_id: UUID, user_data: UserUpdate, current_user: UserOut) -> UserOut:
         """Update user data; only superadmin or owner can modify."""
@@ -65,6 +78,39 @@ class UserService:
         except SQLAlchemyError:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete user")
 
+    async def bulk_create_users(self, users: List[UserBase]) -> BulkResult:
+        """
+        Insert many users in chunked multi-row statements. Raises when
+        nothing was inserted; a partial result lists the created ids.
+        """
+        created = await self.user_crud.bulk_create(
+            [u.model_dump(exclude_unset=True) for u in users], commit=True
+        )
+        if users and not created:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to create users")
+        return BulkResult(
+            requested=len(users), succeeded=len(created), ids=[u.id for u in created]
+        )
+
+    async def bulk_update_users(self, users: List[UserBulkUpdate]) -> BulkResult:
+        """Update many users by id in chunked executemany statements."""
+        updated = await self.user_crud.bulk_update(
+            [u.model_dump(exclude_unset=True) | {"id": u.id} for u in users],
+            commit=True,
+        )
+        done = set(updated)
+        return BulkResult(
+            requested=len(users),
+            succeeded=len(updated),
+            ids=updated,
+            failed_ids=[u.id for u in users if u.id not in done],
+        )
+
+    async def bulk_delete_users(self, user_ids: List[UUID]) -> BulkResult:
+        """Delete many users with chunked DELETE ... WHERE id IN statements."""
+        deleted = await self.user_crud.bulk_delete(user_ids, commit=True)
+        return BulkResult(requested=len(user_ids), succeeded=deleted)
+
     async def get_user_by_email(self, email: str) -> UserOut:
         """Retrieve a user by email address."""
         user = await self.user_crud.get_by_field("email", email)
@@ -76,4 +122,4 @@ class UserService:
 @lru_cache()
 def get_user_service(db: DBSessionDep) -> UserService:
     """Dependency provider for UserService."""
-    return UserService(BaseCRUD(UserModel, db))
+    return UserService(BaseCRUD(UserModel, db, cache=entity_cache))
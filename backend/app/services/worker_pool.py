@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+JobHandler = Callable[[Any], Awaitable[None]]
+DuePoller = Callable[[int], Awaitable[List[Any]]]
+
+
+class WorkerPool:
+    """
+    Runs jobs whose state lives in the database on `concurrency` tasks.
+
+    Job ids reach the pool through `notify()` right after a job is
+    committed, and through `poll(limit)` every `poll_interval` seconds,
+    which returns retries that came due and jobs abandoned by a restart.
+    The in-memory queue only holds ids: when it is full a notification is
+    dropped and the job waits for the next poll; nothing is lost.
+
+    `stop()` cancels running jobs; their rows stay "running" until the
+    poller treats them as abandoned.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: JobHandler,
+        poll: DuePoller,
+        concurrency: int,
+        queue_size: int,
+        poll_interval: float,
+    ):
+        self.name = name
+        self.handler = handler
+        self.poll = poll
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, queue_size))
+        self._queued: Set[Any] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._stats_lock = threading.Lock()
+        self.running = 0
+        self.completed = 0
+        self.errors = 0
+        self.hints_dropped = 0
+        registry[name] = self
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._poll_forever()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self, job_id: Any) -> bool:
+        """Hand a committed job to the pool; False if it has to wait for a poll."""
+        if not self._tasks:
+            return False
+        if job_id in self._queued:
+            return True
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            with self._stats_lock:
+                self.hints_dropped += 1
+            return False
+        self._queued.add(job_id)
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            with self._stats_lock:
+                self.running += 1
+            try:
+                await self.handler(job_id)
+                with self._stats_lock:
+                    self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                logger.error(f"{self.name}: job {job_id} crashed: {e}")
+            finally:
+                with self._stats_lock:
+                    self.running -= 1
+
+    async def _poll_forever(self) -> None:
+        while True:
+            free = self._queue.maxsize - self._queue.qsize()
+            if free > 0:
+                try:
+                    for job_id in await self.poll(free):
+                        self.notify(job_id)
+                except Exception as e:
+                    logger.error(f"{self.name}: polling for due jobs failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "started": self.started,
+                "concurrency": self.concurrency,
+                "queued": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "running": self.running,
+                "completed": self.completed,
+                "errors": self.errors,
+                "hints_dropped": self.hints_dropped,
+            }
+
+
+registry: Dict[str, WorkerPool] = {}
+
+
+def worker_pool_statistics() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in registry.items()}
@@ -0,0 +1,3 @@
+from .backplane import Backplane, InMemoryBackplane, PostgresBackplane, build_backplane
+from .manager import Connection, ConnectionManager, manager
+from .replay import ReplayBuffer
@@ -0,0 +1,288 @@
+import asyncio
+import base64
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import make_url
+
+from core.config import settings
+from core.serialization import dumps, dumps_text, loads
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DeliverHandler = Callable[[str, Any], Awaitable[None]]
+# Called with False when frames may have been lost, True once connected again
+GapHandler = Callable[[bool], None]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+# Raw frame bytes per chunk: base64 (4/3) plus the envelope stays under the limit
+CHUNK_BYTES = 5600
+# Largest frame the backplane carries (~360 KB)
+MAX_CHUNKS = 64
+# Incomplete chunked frames are dropped after this many seconds
+PARTIAL_TTL = 30.0
+# Longest wait between attempts to re-open a lost LISTEN connection
+MAX_RECONNECT_DELAY = 30.0
+
+
+class Backplane:
+    """
+    Pub/sub between workers. Every published frame is handed to the deliver
+    handler of every worker (including the publisher), which fans it out to
+    its own local sockets. Backplanes that can lose frames report it to the
+    gap handler, so state built from the stream (replay, presence) is reset.
+    """
+
+    async def start(self, deliver: DeliverHandler, on_gap: Optional[GapHandler] = None) -> None:
+        raise NotImplementedError
+
+    async def publish(self, room: str, frame: Any) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publishing is local delivery."""
+
+    def __init__(self) -> None:
+        self._deliver: Optional[DeliverHandler] = None
+
+    async def start(self, deliver: DeliverHandler, on_gap: Optional[GapHandler] = None) -> None:
+        self._deliver = deliver
+
+    async def publish(self, room: str, frame: Any) -> None:
+        if self._deliver is not None:
+            await self._deliver(room, frame)
+
+
+class PostgresBackplane(Backplane):
+    """
+    LISTEN/NOTIFY backplane on a dedicated asyncpg connection (it must not go
+    through a transaction-mode pooler such as PgBouncer).
+
+    Frames too large for a NOTIFY payload are split into base64 chunks,
+    sent back to back, and reassembled on each worker. Nothing has to be
+    re-read from the database, which may not have the row yet (replica lag,
+    write-behind).
+
+    A watchdog re-opens the connection (with backoff) when asyncpg reports
+    it terminated or a keepalive query fails, so an idle worker does not
+    silently stop receiving. Notifications sent while it was down are
+    lost: the gap handler hears about the outage and the reconnect, and
+    resuming clients are served from the database in between.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str,
+        keepalive_interval: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.keepalive_interval = keepalive_interval
+        self._conn = None
+        self._deliver: Optional[DeliverHandler] = None
+        self._on_gap: Optional[GapHandler] = None
+        self._lock = asyncio.Lock()
+        self._lost = asyncio.Event()
+        self._watchdog: Optional[asyncio.Task] = None
+        self._tasks: "set[asyncio.Task]" = set()
+        # chunk ref -> (first seen, parts received so far)
+        self._partial: Dict[str, Tuple[float, List[Optional[bytes]]]] = {}
+        self.reconnects = 0
+        self.publish_failures = 0
+
+    async def start(self, deliver: DeliverHandler, on_gap: Optional[GapHandler] = None) -> None:
+        self._deliver = deliver
+        self._on_gap = on_gap
+        await self._connect()
+        self._watchdog = asyncio.create_task(self._watch())
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        conn = await asyncpg.connect(self.dsn)
+        conn.add_termination_listener(self._on_terminated)
+        await conn.add_listener(self.channel, self._on_notify)
+        self._conn = conn
+        logger.info(f"Chat backplane listening on channel {self.channel}")
+
+    def _on_terminated(self, connection) -> None:
+        if connection is self._conn:
+            self._lost.set()
+
+    def _gap(self, connected: bool) -> None:
+        if self._on_gap is None:
+            return
+        try:
+            self._on_gap(connected)
+        except Exception as e:
+            logger.error(f"Chat backplane gap handler failed: {e}")
+
+    async def _healthy(self) -> bool:
+        async with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                return False
+            try:
+                await asyncio.wait_for(self._conn.execute("SELECT 1"), timeout=self.keepalive_interval)
+                return True
+            except Exception as e:
+                logger.warning(f"Chat backplane keepalive failed: {e}")
+                return False
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), timeout=self.keepalive_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._lost.clear()
+            if not await self._healthy():
+                self._gap(False)
+                await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        while True:
+            async with self._lock:
+                if self._conn is not None and not self._conn.is_closed():
+                    return  # a publish already reconnected
+                await self._close()
+                try:
+                    await self._connect()
+                    self.reconnects += 1
+                    self._gap(True)
+                    return
+                except Exception as e:
+                    logger.warning(f"Chat backplane reconnect failed ({e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        task = asyncio.create_task(self._handle(payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, payload: str) -> None:
+        try:
+            envelope = loads(payload)
+            room = envelope["room"]
+            frame = self._reassemble(envelope) if "chunk" in envelope else envelope["frame"]
+            if frame is not None and self._deliver is not None:
+                await self._deliver(room, frame)
+        except Exception as e:
+            logger.error(f"Dropping malformed backplane notification: {e}")
+
+    def _reassemble(self, envelope: Dict[str, Any]) -> Optional[Any]:
+        """Collect one chunk; returns the frame once all its chunks are in."""
+        now = time.monotonic()
+        for ref in [r for r, (seen, _) in self._partial.items() if now - seen > PARTIAL_TTL]:
+            logger.warning(f"Dropping incomplete chunked backplane frame {ref}")
+            del self._partial[ref]
+        ref = envelope["chunk"]
+        _, parts = self._partial.setdefault(ref, (now, [None] * envelope["total"]))
+        parts[envelope["seq"]] = base64.b64decode(envelope["data"])
+        if any(part is None for part in parts):
+            return None
+        del self._partial[ref]
+        return loads(b"".join(parts))
+
+    def _encode(self, room: str, frame: Any) -> List[str]:
+        payload = dumps({"room": room, "frame": frame})
+        if len(payload) <= MAX_NOTIFY_BYTES:
+            return [payload.decode()]
+        data = dumps(frame)
+        parts = [data[i : i + CHUNK_BYTES] for i in range(0, len(data), CHUNK_BYTES)]
+        if len(parts) > MAX_CHUNKS:
+            raise ValueError(f"Frame of {len(data)} bytes is too large for the backplane")
+        ref = uuid.uuid4().hex
+        return [
+            dumps_text(
+                {
+                    "room": room,
+                    "chunk": ref,
+                    "seq": seq,
+                    "total": len(parts),
+                    "data": base64.b64encode(part).decode(),
+                }
+            )
+            for seq, part in enumerate(parts)
+        ]
+
+    async def _notify_all(self, payloads: List[str]) -> None:
+        if self._conn is None:
+            raise ConnectionError("not connected")
+        for payload in payloads:
+            await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def publish(self, room: str, frame: Any) -> None:
+        """
+        NOTIFY every worker. Never raises: callers publish what they have
+        already committed, so a backplane outage must not fail them. The
+        frame then only reaches this worker's sockets; the watchdog takes
+        over reconnecting.
+        """
+        try:
+            payloads = self._encode(room, frame)
+            async with self._lock:
+                try:
+                    await self._notify_all(payloads)
+                except Exception as e:
+                    # Listener connection dropped: reconnect once and retry
+                    logger.warning(f"Chat backplane publish failed ({e}), reconnecting")
+                    self._gap(False)
+                    await self._close()
+                    await self._connect()
+                    self.reconnects += 1
+                    self._gap(True)
+                    await self._notify_all(payloads)
+        except Exception as e:
+            self.publish_failures += 1
+            logger.error(f"Chat backplane dropped a frame for room {room}: {e}")
+            self._lost.set()
+            if self._deliver is not None:
+                await self._deliver(room, frame)
+
+    async def _close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self._conn is not None and not self._conn.is_closed(),
+            "reconnects": self.reconnects,
+            "publish_failures": self.publish_failures,
+        }
+
+    async def stop(self) -> None:
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        for task in list(self._tasks):
+            task.cancel()
+        await self._close()
+
+
+def build_backplane() -> Backplane:
+    if settings.CHAT_BACKPLANE == "postgres":
+        url = make_url(settings.CHAT_BACKPLANE_DSN or settings.DATABASE_URI)
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresBackplane(
+            dsn,
+            settings.CHAT_BACKPLANE_CHANNEL,
+            keepalive_interval=settings.CHAT_BACKPLANE_KEEPALIVE_SECONDS,
+        )
+    return InMemoryBackplane()
@@ -0,0 +1,491 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from core.config import settings
+from core.serialization import dumps
+from logger import get_logger
+from sockets.backplane import Backplane, InMemoryBackplane
+from sockets.replay import ReplayBuffer
+
+logger = get_logger(__name__)
+
+# Close code for sockets that cannot keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Closed by the reaper: nothing received within the idle timeout
+IDLE_CLOSE_CODE = 1001
+# Closed to make room for the same user's newer socket
+REPLACED_CLOSE_CODE = 4409
+# Backplane room of the workers' presence heartbeats (no socket joins it)
+PRESENCE_HEARTBEAT_ROOM = "_presence"
+
+
+def encode_frame(msg: Any) -> Tuple[str, int]:
+    """A text frame and its UTF-8 size, from a single orjson pass."""
+    if isinstance(msg, str):
+        return msg, len(msg.encode())
+    data = dumps(msg)
+    return data.decode(), len(data)
+
+
+class Connection:
+    """
+    One WebSocket plus its bounded outbound queue. A dedicated writer task
+    drains the queue, so a slow client only ever stalls itself.
+    """
+
+    def __init__(
+        self,
+        room: str,
+        ws: WebSocket,
+        user_id: Optional[str],
+        queue_size: int,
+        presence: bool = False,
+    ):
+        self.room = room
+        self.ws = ws
+        self.user_id = user_id
+        # Counts towards the room's presence table (chat rooms opt in)
+        self.presence = presence
+        # Frames are queued already JSON-encoded, with their UTF-8 size
+        self.queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue(maxsize=queue_size)
+        self.queued_bytes = 0
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.closed = False
+        self.opened_at = self.last_seen = time.monotonic()
+        # Last accepted ephemeral event per kind, for rate limiting
+        self.last_event: Dict[str, float] = {}
+
+    def touch(self) -> None:
+        """Record inbound activity (any frame, including pongs)."""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, frame: str, size: Optional[int] = None) -> bool:
+        if self.closed:
+            return False
+        if size is None:
+            size = len(frame.encode())
+        try:
+            self.queue.put_nowait((frame, size))
+        except asyncio.QueueFull:
+            return False
+        self.queued_bytes += size
+        return True
+
+    async def send(self, frame: str) -> None:
+        await self.ws.send_text(frame)
+
+
+class ConnectionManager:
+    """
+    Tracks this worker's sockets per room. Frames meant for a whole room go
+    through `publish`, which hands them to the backplane so every worker
+    delivers them to its own sockets via `broadcast`.
+
+    Typing and presence events are ephemeral: they travel the same way but
+    never touch the database. Presence is opt-in per socket (`connect(...,
+    presence=True)`): each worker keeps the room's presence table (user
+    id -> workers that hold such a socket for that user) from the presence
+    events it sees, and sends it to every new joiner that opted in. Workers
+    with presence sockets heartbeat on every reaper pass; entries of a
+    worker silent for `presence_ttl` (crashed, or cut off from the
+    backplane) are dropped and reported offline.
+
+    Dead peers are detected by the server's protocol-level ping/pong
+    (uvicorn --ws-ping-interval/--ws-ping-timeout), which browsers answer
+    on their own. On top of that, every `heartbeat_interval` each socket
+    gets a {"type": "ping"} frame. Idle closing is opt-in: with an
+    `idle_timeout`, a client must send something at least that often,
+    e.g. reply {"type": "pong"} to each ping, or it is closed with 1001.
+    """
+
+    def __init__(
+        self,
+        queue_size: int,
+        slow_consumer_policy: Literal["drop", "disconnect"],
+        backplane: Optional[Backplane] = None,
+        ephemeral_interval: float = 1.0,
+        replay: Optional[ReplayBuffer] = None,
+        heartbeat_interval: float = 25.0,
+        idle_timeout: float = 0.0,
+        presence_ttl: float = 0.0,
+        max_per_user: int = 0,
+        max_per_room: int = 0,
+    ):
+        self.active: Dict[str, Dict[WebSocket, Connection]] = {}
+        # Same connections by user, oldest first (for the per-user cap)
+        self.by_user: Dict[str, List[Connection]] = {}
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.backplane: Backplane = backplane or InMemoryBackplane()
+        self.ephemeral_interval = ephemeral_interval
+        self.worker_id = uuid.uuid4().hex
+        self.presence: Dict[str, Dict[str, Set[str]]] = {}
+        self.presence_ttl = presence_ttl
+        # Other workers -> when a presence frame or heartbeat last came from them
+        self._origin_seen: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # Recent message frames per room, for resuming clients
+        self.replay = replay or ReplayBuffer(rooms=0, size=0)
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_per_user = max_per_user
+        self.max_per_room = max_per_room
+        self._reaper: Optional[asyncio.Task] = None
+        self.reaped = 0
+        self.rejected = 0
+        self.replaced = 0
+
+    async def start(self, backplane: Optional[Backplane] = None) -> None:
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.start(self._deliver, self._on_backplane_gap)
+        if self.heartbeat_interval > 0 and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.backplane.stop()
+
+    async def publish(self, room: str, msg: Any) -> None:
+        """Deliver `msg` to the room's sockets on every worker."""
+        await self.backplane.publish(room, msg)
+
+    async def connect(
+        self,
+        room: str,
+        ws: WebSocket,
+        user_id: Optional[str] = None,
+        presence: bool = False,
+    ) -> Optional[Connection]:
+        """
+        Accept and register a socket. Returns None (handshake refused) when
+        the room is full; a user over their cap loses their oldest socket.
+        With `presence`, the user is announced to the room and the socket
+        gets a presence snapshot.
+        """
+        if self.max_per_room and len(self.active.get(room, {})) >= self.max_per_room:
+            self.rejected += 1
+            logger.warning(f"Refusing chat socket: room {room} is full")
+            await ws.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            return None
+        await ws.accept()
+        if user_id is not None and self.max_per_user:
+            while len(self.by_user.get(user_id, ())) >= self.max_per_user:
+                oldest = self.by_user[user_id][0]
+                self.replaced += 1
+                self.disconnect(oldest.room, oldest.ws)
+                self._spawn(self._close(oldest.ws, REPLACED_CLOSE_CODE))
+        first = presence and user_id is not None and user_id not in self._local_users(room)
+        conn = Connection(room, ws, user_id, self.queue_size, presence=presence)
+        conn.writer = asyncio.create_task(self._writer(conn))
+        self.active.setdefault(room, {})[ws] = conn
+        if user_id is not None:
+            self.by_user.setdefault(user_id, []).append(conn)
+        if first:
+            # Local table first, so the joiner's snapshot already includes itself
+            frame = self._presence_frame(user_id, "online")
+            self._apply_presence(room, frame)
+        if presence:
+            self.send_personal(conn, {"type": "presence_snapshot", "online": self.online(room)})
+        if first:
+            await self._publish_presence(room, frame)
+        return conn
+
+    def disconnect(self, room: str, ws: WebSocket) -> None:
+        conns = self.active.get(room)
+        conn = conns.pop(ws, None) if conns is not None else None
+        if conns is not None and not conns:
+            del self.active[room]
+        if conn is None:
+            return  # already gone: disconnect is idempotent
+        conn.closed = True
+        if conn.user_id is not None:
+            mine = self.by_user.get(conn.user_id, [])
+            if conn in mine:
+                mine.remove(conn)
+            if not mine:
+                self.by_user.pop(conn.user_id, None)
+        if conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        if conn.presence and conn.user_id is not None and conn.user_id not in self._local_users(room):
+            self._spawn(self._announce(room, conn.user_id, "offline"))
+
+    def connections(self, room: str) -> List[Connection]:
+        return list(self.active.get(room, {}).values())
+
+    def online(self, room: str) -> List[str]:
+        """Users with at least one open socket in the room, on any worker."""
+        return sorted(uid for uid, workers in self.presence.get(room, {}).items() if workers)
+
+    async def emit(self, conn: Connection, event: str, **data: Any) -> bool:
+        """
+        Relay an ephemeral event (e.g. typing) from `conn` to its room.
+        At most one event of each kind per `ephemeral_interval` per socket;
+        extra ones are dropped and False is returned.
+        """
+        key = ":".join([event, *map(str, data.values())])
+        now = time.monotonic()
+        if now - conn.last_event.get(key, float("-inf")) < self.ephemeral_interval:
+            return False
+        conn.last_event[key] = now
+        await self.publish(conn.room, {"type": event, "user_id": conn.user_id, **data})
+        return True
+
+    def _local_users(self, room: str) -> Set[str]:
+        """Users with a presence socket in the room on this worker."""
+        return {
+            c.user_id
+            for c in self.active.get(room, {}).values()
+            if c.presence and c.user_id is not None
+        }
+
+    def _apply_presence(self, room: str, frame: Dict[str, Any]) -> None:
+        if frame["origin"] != self.worker_id:
+            self._origin_seen[frame["origin"]] = time.monotonic()
+        users = self.presence.setdefault(room, {})
+        workers = users.setdefault(frame["user_id"], set())
+        if frame["status"] == "online":
+            workers.add(frame["origin"])
+        else:
+            workers.discard(frame["origin"])
+            if not workers:
+                del users[frame["user_id"]]
+            if not users:
+                del self.presence[room]
+
+    def _presence_frame(self, user_id: str, status: str, sync: bool = False) -> Dict[str, Any]:
+        return {
+            "type": "presence",
+            "user_id": user_id,
+            "status": status,
+            "origin": self.worker_id,
+            "sync": sync,
+        }
+
+    async def _announce(self, room: str, user_id: str, status: str, sync: bool = False) -> None:
+        frame = self._presence_frame(user_id, status, sync)
+        self._apply_presence(room, frame)
+        await self._publish_presence(room, frame)
+
+    async def _publish_presence(self, room: str, frame: Dict[str, Any]) -> None:
+        try:
+            await self.publish(room, frame)
+        except Exception as e:
+            logger.warning(f"Could not publish presence for room {room}: {e}")
+
+    async def _deliver(self, room: str, msg: Any) -> None:
+        """Backplane handler: update presence/replay state, then fan out locally."""
+        if isinstance(msg, dict) and msg.get("type") == "presence_heartbeat":
+            if msg["origin"] != self.worker_id:
+                self._origin_seen[msg["origin"]] = time.monotonic()
+            return
+        if isinstance(msg, dict) and msg.get("type") == "message":
+            self.replay.remember(room, msg)
+        elif isinstance(msg, dict) and msg.get("type") == "presence":
+            self._apply_presence(room, msg)
+            if msg["status"] == "online" and not msg.get("sync") and msg["origin"] != self.worker_id:
+                # A worker that just got a joiner may not know who else is here
+                for uid in self._local_users(room):
+                    self._spawn(self._announce(room, uid, "online", sync=True))
+        await self.broadcast(room, msg)
+
+    def _on_backplane_gap(self, connected: bool) -> None:
+        """
+        Frames from other workers may have been lost. While the backplane is
+        down, resumes are served from the database and only this worker's
+        users count as present; once it is back, local users are announced
+        again, which makes the other workers announce theirs.
+        """
+        if not connected:
+            self.replay.reset(paused=True)
+            for room, users in list(self.presence.items()):
+                for uid, workers in list(users.items()):
+                    workers &= {self.worker_id}
+                    if not workers:
+                        del users[uid]
+                if not users:
+                    del self.presence[room]
+            return
+        self.replay.reset()
+        for room in list(self.active):
+            for uid in self._local_users(room):
+                self._spawn(self._announce(room, uid, "online"))
+
+    def _spawn(self, coro) -> None:
+        # Keep a reference so the task is not garbage-collected mid-flight
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Chat background task failed: {task.exception()}")
+
+    def send_personal(self, conn: Connection, msg: Any) -> None:
+        """Queue a frame for one socket (replies go through its writer too)."""
+        if not conn.enqueue(*encode_frame(msg)):
+            self._on_slow_consumer(conn)
+
+    async def broadcast(self, room: str, msg: Any) -> None:
+        """Queue `msg` for this worker's sockets in the room without awaiting any send."""
+        conns = self.connections(room)
+        if not conns:
+            return
+        # Encode once; every socket gets the same buffer
+        frame, size = encode_frame(msg)
+        for conn in conns:
+            if not conn.enqueue(frame, size):
+                self._on_slow_consumer(conn)
+
+    def _on_slow_consumer(self, conn: Connection) -> None:
+        if conn.closed:
+            return
+        conn.dropped += 1
+        if self.slow_consumer_policy == "disconnect":
+            logger.warning(f"Disconnecting slow chat consumer in room {conn.room}")
+            self.disconnect(conn.room, conn.ws)
+            self._spawn(self._close(conn.ws, SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _writer(self, conn: Connection) -> None:
+        try:
+            while True:
+                frame, size = await conn.queue.get()
+                conn.queued_bytes -= size
+                await conn.send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Peer went away mid-send; the reader loop will notice as well
+            logger.info(f"Chat socket in room {conn.room} failed on send: {e}")
+            self.disconnect(conn.room, conn.ws)
+
+    async def _reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.reap()
+                await self._heartbeat_presence()
+                await self.expire_presence()
+            except Exception as e:
+                logger.error(f"Chat socket reaper failed: {e}")
+
+    def reap(self) -> int:
+        """
+        Close sockets that sent nothing (not even a pong) within the idle
+        timeout, if one is set, and ping the rest. Returns how many were closed.
+        """
+        now = time.monotonic()
+        ping, size = encode_frame({"type": "ping"})
+        closed = 0
+        for room in list(self.active):
+            for conn in self.connections(room):
+                if self.idle_timeout and now - conn.last_seen > self.idle_timeout:
+                    closed += 1
+                    self.disconnect(room, conn.ws)
+                    self._spawn(self._close(conn.ws, IDLE_CLOSE_CODE))
+                else:
+                    # A full queue is already handled by the slow-consumer policy
+                    conn.enqueue(ping, size)
+        if closed:
+            self.reaped += closed
+            logger.info(f"Reaped {closed} idle chat sockets")
+        return closed
+
+    async def _heartbeat_presence(self) -> None:
+        if any(self._local_users(room) for room in self.active):
+            await self._publish_presence(
+                PRESENCE_HEARTBEAT_ROOM, {"type": "presence_heartbeat", "origin": self.worker_id}
+            )
+
+    async def expire_presence(self) -> int:
+        """
+        Drop presence from workers not heard from within `presence_ttl` and
+        tell local sockets those users went offline. Returns how many
+        users went offline.
+        """
+        if not self.presence_ttl:
+            return 0
+        now = time.monotonic()
+        silent = {o for o, seen in self._origin_seen.items() if now - seen > self.presence_ttl}
+        if not silent:
+            return 0
+        for origin in silent:
+            del self._origin_seen[origin]
+        expired = 0
+        for room, users in list(self.presence.items()):
+            for uid, workers in list(users.items()):
+                gone = workers & silent
+                if not gone:
+                    continue
+                workers -= gone
+                if workers:
+                    continue
+                del users[uid]
+                expired += 1
+                frame = {
+                    "type": "presence",
+                    "user_id": uid,
+                    "status": "offline",
+                    "origin": gone.pop(),
+                    "sync": False,
+                }
+                await self.broadcast(room, frame)
+            if not users:
+                del self.presence[room]
+        if expired:
+            logger.warning(f"Expired presence of {expired} users on {len(silent)} silent workers")
+        return expired
+
+    def stats(self) -> Dict[str, Any]:
+        conns = [c for room in self.active.values() for c in room.values()]
+        return {
+            "open_sockets": len(conns),
+            "rooms": len(self.active),
+            "users": len(self.by_user),
+            "queued_frames": sum(c.queue.qsize() for c in conns),
+            "queued_bytes": sum(c.queued_bytes for c in conns),
+            "max_queued_bytes": max((c.queued_bytes for c in conns), default=0),
+            "dropped_frames": sum(c.dropped for c in conns),
+            "presence_rooms": len(self.presence),
+            "presence_workers": len(self._origin_seen),
+            "reaped_total": self.reaped,
+            "rejected_total": self.rejected,
+            "replaced_total": self.replaced,
+            "backplane": self.backplane.stats(),
+            "limits": {
+                "per_user": self.max_per_user,
+                "per_room": self.max_per_room,
+                "idle_timeout_s": self.idle_timeout,
+                "heartbeat_interval_s": self.heartbeat_interval,
+            },
+        }
+
+    @staticmethod
+    async def _close(ws: WebSocket, code: int) -> None:
+        try:
+            if ws.application_state != WebSocketState.DISCONNECTED:
+                await ws.close(code=code)
+        except Exception:
+            pass
+
+
+manager = ConnectionManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    slow_consumer_policy=settings.WS_SLOW_CONSUMER_POLICY,
+    ephemeral_interval=settings.WS_EPHEMERAL_MIN_INTERVAL_MS / 1000,
+    replay=ReplayBuffer(rooms=settings.WS_REPLAY_ROOMS, size=settings.WS_REPLAY_BUFFER_SIZE),
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+    presence_ttl=settings.WS_PRESENCE_TTL_SECONDS,
+    max_per_user=settings.WS_MAX_SOCKETS_PER_USER,
+    max_per_room=settings.WS_MAX_SOCKETS_PER_ROOM,
+)
@@ -0,0 +1,65 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# (created_at, message id) - the same ordering as message history
+Point = Tuple[datetime, str]
+
+
+def _point(frame: Dict[str, Any]) -> Point:
+    created_at = frame["created_at"]
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return created_at, str(frame["id"])
+
+
+class ReplayBuffer:
+    """
+    The last `size` message frames of up to `rooms` rooms (least recently
+    active rooms are dropped first), so a reconnecting client can be sent
+    what it missed without a database query.
+
+    Each room's buffer is trusted to hold every frame since its first one.
+    When the feed may have lost frames, `reset(paused=True)` empties it and
+    stops buffering until `reset()` is called once the feed is whole again.
+    """
+
+    def __init__(self, rooms: int, size: int):
+        self.rooms = rooms
+        self.size = size
+        self.paused = False
+        self._buffers: "OrderedDict[str, Deque[Tuple[Point, Dict[str, Any]]]]" = OrderedDict()
+
+    def reset(self, paused: bool = False) -> None:
+        self._buffers.clear()
+        self.paused = paused
+
+    def remember(self, room: str, frame: Dict[str, Any]) -> None:
+        if self.paused or self.size <= 0 or self.rooms <= 0:
+            return
+        buffer = self._buffers.get(room)
+        if buffer is None:
+            buffer = self._buffers[room] = deque(maxlen=self.size)
+            while len(self._buffers) > self.rooms:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(room)
+        buffer.append((_point(frame), frame))
+
+    def since_id(self, room: str, message_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Frames after the message `message_id`, or None if it is not buffered."""
+        buffer = self._buffers.get(room, ())
+        for i, (point, _) in enumerate(buffer):
+            if point[1] == message_id:
+                return [frame for _, frame in list(buffer)[i + 1 :]]
+        return None
+
+    def since(self, room: str, after: Point) -> Optional[List[Dict[str, Any]]]:
+        """
+        Frames newer than `after`, or None when the buffer cannot vouch for
+        the whole range (it starts later than `after`).
+        """
+        buffer = self._buffers.get(room)
+        if not buffer or buffer[0][0] > after:
+            return None
+        return [frame for point, frame in buffer if point > after]
@@ -0,0 +1,52 @@
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from storage.uploads import StoredUpload
+
+
+class BlobStore:
+    """
+    Content-addressed files under `root`, named by their SHA-256 and
+    sharded two levels deep (<root>/ab/cd/abcd...<ext>), so no directory
+    grows past a few thousand entries even with millions of blobs.
+    Uploads are staged in <root>/tmp on the same filesystem, which keeps
+    moving them into place a single atomic rename.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.staging = os.path.join(root, "tmp")
+
+    def path_for(self, digest: str, ext: str = "") -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def path_for_upload(self, upload: StoredUpload) -> str:
+        return self.path_for(upload.sha256, os.path.splitext(upload.path)[1])
+
+    async def adopt(self, upload: StoredUpload) -> str:
+        """Move a staged upload to its content address, replacing any copy already there."""
+        path = self.path_for_upload(upload)
+
+        def place() -> None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Always rename: the bytes are identical, and a copy that is being
+            # collected right now must not be what this upload relies on
+            os.replace(upload.path, path)
+
+        await run_in_threadpool(place)
+        return path
+
+    async def discard(self, upload: StoredUpload) -> None:
+        """Remove a staged upload that was never adopted (adopting moves it away)."""
+        await run_in_threadpool(self.remove, upload.path)
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+blob_store = BlobStore(settings.SCAN_UPLOAD_DIR)
@@ -0,0 +1,88 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+
+class UploadTooLarge(ValueError):
+    """Raised as soon as an upload grows past the configured maximum."""
+
+
+class UnsupportedMediaType(ValueError):
+    """Raised when the first bytes of an upload are not an accepted image format."""
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """(content type, file extension) from an image's leading bytes."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", ".png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"heim", b"heis", b"mif1", b"msf1"):
+        return "image/heic", ".heic"
+    return None
+
+
+async def save_upload(
+    file: UploadFile, directory: str, max_bytes: int, chunk_size: int
+) -> StoredUpload:
+    """
+    Copy an upload to `directory` one chunk at a time, never holding more
+    than a chunk in memory. File I/O and hashing run in the threadpool, the
+    SHA-256 is computed as the bytes go by, the format is sniffed from the
+    first chunk and the size cap is enforced while copying. Partial files
+    are removed on any failure.
+    """
+    await run_in_threadpool(os.makedirs, directory, exist_ok=True)
+    partial = os.path.join(directory, f".{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    kind = None
+    out = await run_in_threadpool(open, partial, "wb")
+
+    def write(chunk: bytes) -> None:
+        # hashlib releases the GIL for large buffers
+        digest.update(chunk)
+        out.write(chunk)
+
+    try:
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            if kind is None:
+                kind = sniff_image_type(chunk[:16])
+                if kind is None:
+                    raise UnsupportedMediaType("Only JPEG, PNG, WebP and HEIC images are accepted")
+            await run_in_threadpool(write, chunk)
+        if kind is None:
+            raise UnsupportedMediaType("Empty upload")
+        await run_in_threadpool(out.close)
+        path = os.path.join(directory, f"{uuid4().hex}{kind[1]}")
+        await run_in_threadpool(os.replace, partial, path)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(_remove_quietly, partial)
+        raise
+    return StoredUpload(path=path, size=size, sha256=digest.hexdigest(), content_type=kind[0])
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+# Settings are read at import time: point the app at a throwaway SQLite file
+scratch = tempfile.mkdtemp()
+os.environ["DATABASE_URI"] = "sqlite:///" + os.path.join(scratch, "test.db")
+os.environ["SCAN_UPLOAD_DIR"] = os.path.join(scratch, "scans")
+for key, value in {
+    "SUPABASE_URL": "http://localhost",
+    "SUPABASE_SECRET_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.dGVzdA",
+    "SUPABASE_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.dGVzdA",
+    "SUPERADMIN_EMAIL": "admin@example.com",
+    "SUPERADMIN_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,101 @@
+import asyncio
+
+from sockets.backplane import PostgresBackplane
+from sockets.manager import ConnectionManager
+from sockets.replay import ReplayBuffer
+
+
+class FakeConnection:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.notified = []
+
+    def is_closed(self) -> bool:
+        return False
+
+    async def execute(self, query, *args):
+        if self.fail:
+            raise ConnectionError("connection lost")
+        self.notified.append(args)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeBackplane(PostgresBackplane):
+    """Hands out scripted connections instead of opening asyncpg ones."""
+
+    def __init__(self, *fail: bool):
+        super().__init__("postgresql://unused", "chat")
+        self.script = list(fail)
+        self.opened = []
+
+    async def _connect(self) -> None:
+        if not self.script:
+            raise OSError("database unreachable")
+        self._conn = FakeConnection(self.script.pop(0))
+        self.opened.append(self._conn)
+
+
+def test_publish_survives_a_failed_reconnect_and_delivers_locally():
+    async def scenario():
+        delivered = []
+
+        async def deliver(room, frame):
+            delivered.append((room, frame))
+
+        backplane = FakeBackplane(True)
+        backplane._deliver = deliver
+        await backplane._connect()
+        await backplane.publish("room", {"type": "message", "id": "1"})
+        assert delivered == [("room", {"type": "message", "id": "1"})]
+        assert backplane.publish_failures == 1
+        assert backplane._lost.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_publish_reconnects_once_and_retries():
+    async def scenario():
+        backplane = FakeBackplane(True, False)
+        await backplane._connect()
+        await backplane.publish("room", {"type": "typing"})
+        assert len(backplane.opened[1].notified) == 1
+        assert backplane.stats() == {"connected": True, "reconnects": 1, "publish_failures": 0}
+
+    asyncio.run(scenario())
+
+
+def test_publish_reports_the_gap_around_an_inline_reconnect():
+    async def scenario():
+        gaps = []
+        backplane = FakeBackplane(True, False)
+        backplane._on_gap = gaps.append
+        await backplane._connect()
+        await backplane.publish("room", {"type": "typing"})
+        assert gaps == [False, True]
+
+    asyncio.run(scenario())
+
+
+def test_backplane_gap_resets_replay_and_remote_presence():
+    async def scenario():
+        manager = ConnectionManager(
+            queue_size=8, slow_consumer_policy="drop", replay=ReplayBuffer(rooms=4, size=8)
+        )
+        first = {"type": "message", "id": "1", "created_at": "2024-01-01T00:00:00"}
+        later = {"type": "message", "id": "2", "created_at": "2024-01-01T00:00:05"}
+        await manager._deliver("room", first)
+        manager._apply_presence("room", {"user_id": "remote", "status": "online", "origin": "other"})
+        manager._apply_presence("room", {"user_id": "local", "status": "online", "origin": manager.worker_id})
+
+        manager._on_backplane_gap(False)
+        await manager._deliver("room", later)
+        assert manager.replay.since_id("room", "1") is None
+        assert manager.online("room") == ["local"]
+
+        manager._on_backplane_gap(True)
+        await manager._deliver("room", later)
+        assert manager.replay.since_id("room", "2") == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+import asyncio
+import uuid
+
+from crud.base_crud import BaseCRUD
+from database import AsyncSessionLocal, Base, engine
+from models import User
+
+
+def test_bulk_create_returns_readable_rows_when_a_later_chunk_fails():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        taken = f"{uuid.uuid4()}@example.com"
+        async with AsyncSessionLocal() as db:
+            db.add(User(email=taken, name="Taken", role="customer"))
+            await db.commit()
+        rows = [
+            {"email": f"{uuid.uuid4()}@example.com", "name": "New", "role": "customer"},
+            {"email": f"{uuid.uuid4()}@example.com", "name": "New", "role": "customer"},
+            {"email": taken, "name": "Duplicate", "role": "customer"},
+        ]
+        async with AsyncSessionLocal() as db:
+            created = await BaseCRUD(User, db).bulk_create(rows, chunk_size=2, commit=True)
+        assert [u.email for u in created] == [r["email"] for r in rows[:2]]
+        assert all(u.id for u in created)
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import tempfile
+import uuid
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+from crud.base_crud import BaseCRUD
+from crud.cache import TTLCache
+from database import AsyncSessionLocal, Base, engine
+from models import User
+
+
+def test_cache_misses_are_filled_from_the_primary(monkeypatch):
+    replica = create_async_engine(
+        "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "replica.db")
+    )
+    monkeypatch.setattr(database, "replica_engine", replica)
+
+    async def scenario():
+        user_id = uuid.uuid4()
+        for target, name in ((engine, "Updated"), (replica, "Stale")):
+            async with target.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(
+                    User.__table__.insert(),
+                    {"id": user_id, "email": f"{user_id}@example.com", "name": name, "role": "customer"},
+                )
+        cache = TTLCache("test_users", maxsize=10, ttl=60)
+        async with AsyncSessionLocal() as db:
+            # plain reads still go to the lagging replica
+            assert (await BaseCRUD(User, db).get_all_by_field("id", user_id))[0].name == "Stale"
+        async with AsyncSessionLocal() as db:
+            assert (await BaseCRUD(User, db, cache=cache).get_by_id(user_id)).name == "Updated"
+        async with AsyncSessionLocal() as db:
+            assert (await BaseCRUD(User, db, cache=cache).get_by_id(user_id)).name == "Updated"
+        await replica.dispose()
+
+    asyncio.run(scenario())
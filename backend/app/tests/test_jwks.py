@@ -0,0 +1,52 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from dependencies import auth
+
+
+class FakeJWKSClient:
+    def __init__(self, keys):
+        self.keys = keys
+        self.fetches = 0
+
+    def get_signing_keys(self):
+        self.fetches += 1
+        return [jwt.PyJWK(jwt.algorithms.ECAlgorithm.to_jwk(key, as_dict=True) | {"kid": kid})
+                for kid, key in self.keys.items()]
+
+
+def _token(private_key, kid):
+    claims = {"sub": "u1", "exp": 4102444800, "aud": "authenticated",
+              "user_metadata": {"role": "customer"}}
+    return jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    client = FakeJWKSClient({"k1": private_key.public_key()})
+    monkeypatch.setattr(auth, "_jwks_client", lambda: client)
+    monkeypatch.setattr(auth, "signing_keys", auth.SigningKeys())
+    return private_key, client
+
+
+def test_known_kid_is_verified_from_the_cached_keys(jwks):
+    private_key, client = jwks
+    for _ in range(3):
+        assert auth.verify_jwt_locally(_token(private_key, "k1"))["id"] == "u1"
+    assert client.fetches == 1
+
+
+def test_unknown_kids_are_rejected_without_refetching_or_remote_fallback(jwks, monkeypatch):
+    private_key, client = jwks
+    monkeypatch.setattr(auth, "verify_jwt_remotely", lambda token: pytest.fail("remote call"))
+    auth.verify_jwt_locally(_token(private_key, "k1"))
+    for n in range(5):
+        token = _token(private_key, f"forged-{n}")
+        with pytest.raises(HTTPException) as e:
+            auth.verify_jwt(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        assert e.value.status_code == 401
+    assert client.fetches == 1
@@ -0,0 +1,71 @@
+import asyncio
+import uuid
+
+from sqlalchemy import select, update
+
+from crud.chat import MessageCRUD
+from database import AsyncSessionLocal, Base, engine
+from models import Chat, Message
+
+
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _search_text(db, msg_id):
+    return await db.scalar(select(Message.search_text).where(Message.id == msg_id))
+
+
+def test_search_text_survives_updates_that_do_not_touch_content():
+    async def scenario():
+        await _create_tables()
+        async with AsyncSessionLocal() as db:
+            msg = Message(chat_id=uuid.uuid4(), sender_id=uuid.uuid4(), content="Hello World")
+            db.add(msg)
+            await db.commit()
+            await db.execute(update(Message).where(Message.id == msg.id).values(image_url="x.png"))
+            await db.commit()
+            assert await _search_text(db, msg.id) == "hello world"
+
+    asyncio.run(scenario())
+
+
+def test_search_text_follows_content_changes():
+    async def scenario():
+        await _create_tables()
+        async with AsyncSessionLocal() as db:
+            msg = Message(chat_id=uuid.uuid4(), sender_id=uuid.uuid4(), content="first")
+            db.add(msg)
+            await db.commit()
+            await MessageCRUD(Message, db).update(msg.id, {"content": "Second"}, commit=True)
+            assert await _search_text(db, msg.id) == "second"
+            msg.content = "THIRD"
+            await db.commit()
+            assert await _search_text(db, msg.id) == "third"
+
+    asyncio.run(scenario())
+
+
+def test_search_snippets_keep_the_original_text_and_escape_it():
+    async def scenario():
+        await _create_tables()
+        customer, merchant = uuid.uuid4(), uuid.uuid4()
+        async with AsyncSessionLocal() as db:
+            chat = Chat(customer_id=customer, merchant_id=merchant)
+            db.add(chat)
+            await db.flush()
+            db.add_all([
+                Message(chat_id=chat.id, sender_id=customer, content="أريدُ Ring ذهبيّة"),
+                Message(chat_id=chat.id, sender_id=merchant, content="<img src=x onerror=alert(1)> ring"),
+            ])
+            await db.commit()
+            hits, _ = await MessageCRUD(Message, db).search(customer, "ذهبية", chat_id=chat.id)
+            assert [h.snippet for h in hits] == ["أريدُ Ring <b>ذهبيّة</b>"]
+            hits, _ = await MessageCRUD(Message, db).search(merchant, "RING", chat_id=chat.id)
+            assert sorted(h.snippet for h in hits) == [
+                "&lt;img src=x onerror=alert(1)&gt; <b>ring</b>",
+                "أريدُ <b>Ring</b> ذهبيّة",
+            ]
+
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+import asyncio
+
+from starlette.websockets import WebSocketState
+
+from core.serialization import loads
+from sockets.manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.application_state = WebSocketState.CONNECTED
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(loads(text))
+
+    async def close(self, code=1000):
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+def _manager() -> ConnectionManager:
+    return ConnectionManager(queue_size=8, slow_consumer_policy="drop", heartbeat_interval=0)
+
+
+def test_presence_is_opt_in_per_socket():
+    async def scenario():
+        manager = _manager()
+        await manager.start()
+        chat, scans = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("chat", chat, user_id="u1", presence=True)
+        await manager.connect("scans:u1", scans, user_id="u1")
+        await asyncio.sleep(0)
+        assert [f["type"] for f in chat.sent] == ["presence_snapshot", "presence"]
+        assert scans.sent == []
+        assert manager.online("scans:u1") == []
+        manager.disconnect("scans:u1", scans)
+        assert manager.online("chat") == ["u1"]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_presence_from_a_silent_worker_expires():
+    async def scenario():
+        manager = _manager()
+        manager.presence_ttl = 0.05
+        await manager.start()
+        ws = FakeWebSocket()
+        await manager.connect("chat", ws, user_id="u1", presence=True)
+        for uid, origin in (("u2", "crashed"), ("u3", "alive")):
+            await manager._deliver(
+                "chat", {"type": "presence", "user_id": uid, "status": "online", "origin": origin, "sync": True}
+            )
+        await asyncio.sleep(0.1)
+        await manager._deliver("_presence", {"type": "presence_heartbeat", "origin": "alive"})
+        assert await manager.expire_presence() == 1
+        assert manager.online("chat") == ["u1", "u3"]
+        await asyncio.sleep(0)
+        assert ws.sent[-1] == {"type": "presence", "user_id": "u2", "status": "offline", "origin": "crashed", "sync": False}
+        await manager.stop()
+
+    asyncio.run(scenario())
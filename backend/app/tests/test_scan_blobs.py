@@ -0,0 +1,38 @@
+import asyncio
+import os
+import tempfile
+
+from database import AsyncSessionLocal, Base, engine
+from models import ScanBlob
+from crud.scan import collect_blob
+
+
+def _blob_file() -> str:
+    fd, path = tempfile.mkstemp(suffix=".png")
+    os.close(fd)
+    return path
+
+
+def test_collect_blob_keeps_a_file_that_is_referenced_again():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        path = _blob_file()
+        async with AsyncSessionLocal() as db:
+            db.add(ScanBlob(digest="a" * 64, path=path, size=1, content_type="image/png", ref_count=1))
+            await db.commit()
+        await collect_blob("a" * 64, path)
+        assert os.path.exists(path)
+
+    asyncio.run(scenario())
+
+
+def test_collect_blob_removes_an_unreferenced_file():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        path = _blob_file()
+        await collect_blob("b" * 64, path)
+        assert not os.path.exists(path)
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+import asyncio
+import hashlib
+import os
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from database import AsyncSessionLocal, Base, engine
+from models import ScanBlob, ScanJob, User
+from services import scan_service
+from storage.blobs import blob_store
+from storage.uploads import StoredUpload
+
+
+@pytest.fixture
+def foreign_keys():
+    """SQLite only checks foreign keys on connections that ask for it."""
+    def enforce(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    event.listen(engine.sync_engine, "connect", enforce)
+    yield
+    event.remove(engine.sync_engine, "connect", enforce)
+    asyncio.run(engine.dispose())
+
+
+def _staged_upload(data: bytes) -> StoredUpload:
+    os.makedirs(blob_store.staging, exist_ok=True)
+    path = os.path.join(blob_store.staging, f"{uuid.uuid4().hex}.png")
+    with open(path, "wb") as f:
+        f.write(data)
+    return StoredUpload(path, len(data), hashlib.sha256(data).hexdigest(), "image/png")
+
+
+def test_finished_job_does_not_pin_its_blob(monkeypatch, foreign_keys):
+    async def fake_prediction(image_path):
+        return "benign"
+
+    monkeypatch.setattr(scan_service, "perform_scan_prediction", fake_prediction)
+
+    async def scenario():
+        # pooled connections were opened without the pragma
+        await engine.dispose()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        user_id = uuid.uuid4()
+        upload = _staged_upload(b"\x89PNG\r\n\x1a\n" + os.urandom(64))
+        async with AsyncSessionLocal() as db:
+            db.add(User(id=user_id, email=f"{user_id}@example.com", name="Scan"))
+            await db.commit()
+            job = await scan_service.build_scan_service(db).enqueue_scan(user_id, upload)
+
+        await scan_service.run_scan_job(job.id)
+
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ScanJob, job.id)
+            assert job.status == "done"
+            assert job.blob_digest is None
+            path = blob_store.path_for_upload(upload)
+            assert os.path.exists(path)
+            await scan_service.build_scan_service(db).delete_scan(job.scan_id)
+
+        async with AsyncSessionLocal() as db:
+            assert await db.get(ScanBlob, upload.sha256) is None
+        assert not os.path.exists(path)
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_releases_its_blob(monkeypatch, foreign_keys):
+    async def broken_prediction(image_path):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(scan_service, "perform_scan_prediction", broken_prediction)
+    monkeypatch.setattr(scan_service.settings, "SCAN_JOB_MAX_ATTEMPTS", 1)
+
+    async def scenario():
+        await engine.dispose()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        user_id = uuid.uuid4()
+        upload = _staged_upload(b"\x89PNG\r\n\x1a\n" + os.urandom(64))
+        async with AsyncSessionLocal() as db:
+            db.add(User(id=user_id, email=f"{user_id}@example.com", name="Scan"))
+            await db.commit()
+            job = await scan_service.build_scan_service(db).enqueue_scan(user_id, upload)
+
+        await scan_service.run_scan_job(job.id)
+
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ScanJob, job.id)
+            assert job.status == "failed"
+            assert job.blob_digest is None
+            assert await db.get(ScanBlob, upload.sha256) is None
+        assert not os.path.exists(blob_store.path_for_upload(upload))
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import asyncio
+import uuid
+
+from crud.base_crud import BaseCRUD
+from crud.cache import TTLCache
+from database import AsyncSessionLocal, Base, engine
+from models import User
+
+
+def _user_row():
+    user_id = uuid.uuid4()
+    return {"id": user_id, "email": f"{user_id}@example.com", "name": "Before", "role": "customer"}
+
+
+def test_explicit_commit_runs_and_clears_deferred_callbacks():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        cache = TTLCache("test_uow_users", maxsize=10, ttl=60)
+        async with AsyncSessionLocal() as db:
+            db.info["unit_of_work"] = True
+            crud = BaseCRUD(User, db, cache=cache)
+            user = await crud.create(_user_row(), commit=True)
+            await crud.get_by_id(user.id)  # cached once committed
+            for n in range(3):
+                await crud.update(user.id, {"name": f"After {n}"}, commit=True)
+                assert not db.info.get("after_commit")
+            assert cache.get(crud._cache_key(user.id)) is None
+            assert (await crud.get_by_id(user.id)).name == "After 2"
+
+    asyncio.run(scenario())
+
+
+def test_rollback_drops_callbacks_of_the_failed_unit():
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        ran = []
+        async with AsyncSessionLocal() as db:
+            db.info["unit_of_work"] = True
+            crud = BaseCRUD(User, db)
+            await crud.create(_user_row(), commit=False)
+            db.info.setdefault("after_commit", []).append(lambda: ran.append(True))
+            await crud._rollback()
+            await crud.create(_user_row(), commit=True)
+        assert ran == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from crud.write_behind import WriteBehindBuffer, WriteBehindFull
+
+
+def test_submit_rejects_rows_while_the_database_is_down(monkeypatch):
+    async def scenario():
+        buffer = WriteBehindBuffer("test_down", None, batch_size=2, interval=60, max_pending=3)
+
+        async def failing_insert(rows):
+            raise OperationalError("INSERT", {}, Exception("database is down"))
+
+        monkeypatch.setattr(buffer, "_insert", failing_insert)
+        await buffer.start()
+        try:
+            for i in range(3):
+                await buffer.submit({"id": i})
+            with pytest.raises(WriteBehindFull):
+                await buffer.submit({"id": 3})
+            # the rejected row is not buffered, the accepted ones are kept for a retry
+            assert buffer.pending == 3
+            assert buffer.stats()["rows_rejected"] == 1
+        finally:
+            buffer._task.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_submit_accepts_rows_again_once_a_flush_succeeds(monkeypatch):
+    async def scenario():
+        buffer = WriteBehindBuffer("test_recover", None, batch_size=10, interval=60, max_pending=2)
+        written = []
+        down = True
+
+        async def flaky_insert(rows):
+            if down:
+                raise OperationalError("INSERT", {}, Exception("database is down"))
+            written.extend(rows)
+
+        monkeypatch.setattr(buffer, "_insert", flaky_insert)
+        await buffer.start()
+        try:
+            await buffer.submit({"id": 0})
+            await buffer.submit({"id": 1})
+            down = False
+            await buffer.submit({"id": 2})
+            assert [row["id"] for row in written] == [0, 1]
+            assert buffer.pending == 1
+        finally:
+            buffer._task.cancel()
+
+    asyncio.run(scenario())